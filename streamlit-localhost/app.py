@@ -1,62 +1,44 @@
 import streamlit as st
-import pandas as pd
 import altair as alt
+from calendario import rotular
+from dataset import prepare_dropouts
+from grade_mensal import MESES_INCOMPLETOS, grade_mensal
 
 st.title("Análise de Desistências por Motivo e Período")
 
 # Caminho do arquivo Excel (ajuste se precisar)
 caminho_arquivo = 'desistencia.xlsx'
 
-try:
-    df = pd.read_excel(caminho_arquivo)
-
-    df_filtrado = df[
-        (df['estágio'].isin(['Desistiu', 'Desistência'])) &
-        (pd.to_datetime(df['data_de_desistência_do_curso']).dt.year != 2026)
-    ].copy()
-
-    df_filtrado['data_de_desistência_do_curso'] = pd.to_datetime(df_filtrado['data_de_desistência_do_curso'])
-    df_filtrado['ano_mes'] = df_filtrado['data_de_desistência_do_curso'].dt.to_period('M')
-
-    df_selecionado = df_filtrado[['proprietário_do_matrícula', 'data_de_desistência_do_curso',
-                                  'estágio', 'ano_mes', 'motivo_da_desistência',
-                                  'sexo', 'renda_individual_mensal', 'situação_de_emprego_atual']].copy()
+# Colunas usadas pela página; só elas são lidas da planilha
+colunas_selecionadas = ['proprietário_do_matrícula', 'data_de_desistência_do_curso',
+                        'estágio', 'ano_mes', 'motivo_da_desistência',
+                        'sexo', 'renda_individual_mensal', 'situação_de_emprego_atual']
 
-    df_selecionado['motivo_da_desistência'] = df_selecionado['motivo_da_desistência'].replace({
-        'Motivos de sáude/pessoal': 'Motivos de saúde/pessoal',
-        'Motivos de saúde/pessoal.': 'Motivos de saúde/pessoal'
-    })
-
-    # Agrupar por ano_mes e motivo_da_desistência
-    pivot = df_selecionado.groupby(['ano_mes', 'motivo_da_desistência']).size().unstack(fill_value=0)
-
-    min_periodo = min(pivot.index.min(), pd.Period('2024-10', freq='M'))
-    max_periodo = pivot.index.max()
-    periodos_completos = pd.period_range(min_periodo, max_periodo, freq='M')
-    pivot = pivot.reindex(periodos_completos, fill_value=0)
+try:
+    # Desistências já filtradas, com datas convertidas e motivos corrigidos
+    df_filtrado = prepare_dropouts(caminho_arquivo, derivadas=['ano_mes'], colunas=colunas_selecionadas)
 
-    meses_pt = ['Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
-                'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro']
+    df_selecionado = df_filtrado[colunas_selecionadas]
 
-    formatted_index = [f"{meses_pt[p.month - 1]}/{str(p.year)[2:]}" for p in pivot.index]
-    pivot.index = formatted_index
+    # Contagens por ano_mes e motivo_da_desistência, com zero nos meses sem registro
+    contagens = df_selecionado.groupby(
+        ['ano_mes', 'motivo_da_desistência'], observed=True
+    ).size().reset_index(name='quantidade')
+    grade = grade_mensal(contagens, 'motivo_da_desistência')
 
-    evasao_sem_justificativa_total = pivot.get('Evasão sem justificativa/sem retorno', pd.Series([0])).sum()
+    total_por_motivo = grade.totais()
+    evasao_sem_justificativa_total = total_por_motivo.get('Evasão sem justificativa/sem retorno', 0)
 
     # Remover categoria e meses indesejados para gráfico
-    pivot_grafico = pivot.drop(columns=['Evasão sem justificativa/sem retorno'], errors='ignore')
-    meses_para_remover = ['Agosto/22', 'Dezembro/22', 'Janeiro/23']
-    pivot_grafico = pivot_grafico.drop(index=meses_para_remover, errors='ignore')
-
-    # Definir nome do índice para melt funcionar
-    pivot_grafico.index.name = 'ano_mes'
+    grade_grafico = grade.sem_categorias(['Evasão sem justificativa/sem retorno']).sem_meses(MESES_INCOMPLETOS)
 
-    # Transformar pivot para formato "long" para Altair
-    df_long = pivot_grafico.reset_index().melt(id_vars='ano_mes', var_name='Motivo', value_name='Desistências')
+    # Formato "long" para Altair, com rótulos 'Mês/aa' vindos do calendário (calendario.py)
+    df_long = grade_grafico.longa('Motivo', 'Desistências')
+    df_long['ano_mes'] = rotular(df_long['ano_mes'])
 
     # Gráfico de barras empilhadas com Altair
     chart = alt.Chart(df_long).mark_bar().encode(
-        x=alt.X('ano_mes:N', title='Mês/Ano', sort=list(pivot_grafico.index)),
+        x=alt.X('ano_mes:N', title='Mês/Ano', sort=list(rotular(grade_grafico.periodos))),
         y=alt.Y('Desistências:Q', title='Número de desistências'),
         color=alt.Color('Motivo:N', title='Motivo da Desistência'),
         tooltip=['ano_mes', 'Motivo', 'Desistências']
@@ -72,7 +54,6 @@ try:
     st.altair_chart(chart, use_container_width=True)
 
     st.subheader("Resumo das desistências por motivo (excluindo 'Evasão sem justificativa/sem retorno')")
-    total_por_motivo = pivot.sum()
     for motivo, total in total_por_motivo.items():
         if motivo != 'Evasão sem justificativa/sem retorno':
             st.write(f"- **{motivo}**: {total}")
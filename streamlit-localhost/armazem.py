@@ -0,0 +1,95 @@
+import hashlib
+import json
+import os
+
+from cache_colunar import PASTA_CACHE, _gravar_atomico
+
+# O pyarrow é opcional: sem ele cada processo guarda só a sua própria cópia
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+# Armazém compartilhado: o DataFrame limpo e os agregados de cada versão da planilha
+# são gravados uma vez em Arrow (IPC, sem compressão) e todos os processos do
+# Streamlit os mapeiam em memória. Colunas numéricas, datas e Periods usam direto
+# as páginas do arquivo, divididas entre os processos pelo sistema operacional;
+# códigos das categorias e máscaras de nulos ainda são copiados por processo.
+PASTA_COMPARTILHADA = os.path.join(PASTA_CACHE, 'compartilhado')
+
+# Versões mantidas por conjunto (as mais antigas são apagadas)
+MAX_VERSOES_COMPARTILHADAS = 4
+
+# Módulos que definem o conteúdo guardado: se algum mudar, as cópias são refeitas
+_PASTA = os.path.dirname(os.path.abspath(__file__))
+MODULOS_DADOS = ['dataset.py', 'cubo.py', 'renda.py', 'esquema.py']
+
+
+def _versao_codigo():
+    h = hashlib.sha256()
+    for modulo in MODULOS_DADOS:
+        with open(os.path.join(_PASTA, modulo), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()[:12]
+
+
+VERSAO_CODIGO = _versao_codigo()
+
+
+def _arquivo(nome, parametros, versao):
+    chave = json.dumps([nome, parametros, VERSAO_CODIGO], default=str, ensure_ascii=False)
+    prefixo = f'{nome}-{hashlib.sha256(chave.encode("utf-8")).hexdigest()[:12]}-'
+    return os.path.join(PASTA_COMPARTILHADA, f'{prefixo}{str(versao)[:16]}.arrow'), prefixo
+
+
+def gravar_arrow(df, destino):
+    tabela = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(destino, 'wb') as f:
+        with pa.ipc.new_file(f, tabela.schema) as escritor:
+            escritor.write_table(tabela)
+
+
+def mapear_arrow(arquivo):
+    """DataFrame apoiado no arquivo mapeado em memória (as colunas que permitem não são copiadas)."""
+    tabela = pa.ipc.open_file(pa.memory_map(arquivo, 'r')).read_all()
+    return tabela.to_pandas(split_blocks=True)
+
+
+def _limpar_versoes(prefixo, atual):
+    # Quem ainda mapeia uma versão apagada continua lendo normalmente (Linux);
+    # onde o sistema não deixa apagar, o arquivo fica para a próxima limpeza
+    arquivos = [
+        os.path.join(PASTA_COMPARTILHADA, nome) for nome in os.listdir(PASTA_COMPARTILHADA)
+        if nome.startswith(prefixo) and nome.endswith('.arrow')
+    ]
+    arquivos = sorted((a for a in arquivos if a != atual), key=os.path.getmtime, reverse=True)
+    for antigo in arquivos[MAX_VERSOES_COMPARTILHADAS - 1:]:
+        try:
+            os.remove(antigo)
+        except OSError:
+            pass
+
+
+def compartilhado(nome, parametros, versao, construir):
+    """Resultado de ``construir()`` para esta versão, montado por um só processo e mapeado pelos demais.
+
+    ``parametros`` distingue conjuntos do mesmo nome (planilha, filtros, colunas...).
+    """
+    if pa is None:
+        return construir()
+
+    arquivo, prefixo = _arquivo(nome, parametros, versao)
+    try:
+        return mapear_arrow(arquivo)
+    except (OSError, ValueError):  # ainda não existe (ou está incompleto): monta aqui
+        pass
+
+    df = construir()
+    try:
+        os.makedirs(PASTA_COMPARTILHADA, exist_ok=True)
+        _gravar_atomico(arquivo, lambda tmp: gravar_arrow(df, tmp))
+        _limpar_versoes(prefixo, arquivo)
+        return mapear_arrow(arquivo)
+    except (OSError, ValueError, TypeError):
+        # Sem como gravar (disco, permissão, tipo sem Arrow): fica só a cópia deste processo
+        return df
@@ -0,0 +1,95 @@
+import os
+import threading
+import time
+
+import streamlit as st
+
+from cache_colunar import PARQUET_DISPONIVEL, descartar_versoes_antigas, versao_planilha
+
+# Atualização em segundo plano: quando uma planilha é trocada, as sessões continuam
+# usando a versão anterior (já em cache) enquanto um worker monta os caches da nova;
+# só depois de prontos a versão publicada muda, de uma vez, para todas as sessões.
+
+# Intervalo entre verificações das planilhas (segundos)
+INTERVALO_VERIFICACAO = 2.0
+
+
+def _assinatura(caminho):
+    info = os.stat(caminho)
+    return info.st_mtime_ns, info.st_size
+
+
+class MonitorPlanilhas(threading.Thread):
+    """Observa as planilhas em uso e reconstrói os caches de cada versão nova fora das sessões."""
+
+    def __init__(self, intervalo=INTERVALO_VERIFICACAO):
+        super().__init__(daemon=True, name='monitor-planilhas')
+        self.intervalo = intervalo
+        # Versão que as sessões recebem, por planilha
+        self.publicadas = {}
+        # Último erro ao reconstruir (a versão anterior continua publicada)
+        self.ultimo_erro = None
+        self._assinaturas = {}
+        self._construtores = {}
+        self._trava = threading.Lock()
+
+    def versao(self, caminho, chave=None, construir=None):
+        """Versão publicada da planilha; ``construir(versao)`` é chamado a cada versão nova."""
+        if construir is not None:
+            with self._trava:
+                self._construtores.setdefault(caminho, {})[chave] = construir
+        versao = self.publicadas.get(caminho)
+        if versao is None:
+            # Primeira vez que a planilha é pedida: a própria sessão monta a versão atual
+            assinatura = _assinatura(caminho)
+            versao = versao_planilha(caminho)
+            with self._trava:
+                self._assinaturas.setdefault(caminho, assinatura)
+                versao = self.publicadas.setdefault(caminho, versao)
+        return versao
+
+    def verificar(self, caminho):
+        """Reconstrói e publica a versão nova da planilha, se ela mudou. Retorna se publicou."""
+        assinatura = _assinatura(caminho)
+        if assinatura == self._assinaturas.get(caminho):
+            return False
+        versao = versao_planilha(caminho)
+        publicou = versao != self.publicadas[caminho]
+        if publicou:
+            with self._trava:
+                construtores = list(self._construtores.get(caminho, {}).values())
+            for construir in construtores:
+                construir(versao)
+            # Troca atômica: as execuções seguintes já pegam os caches prontos
+            self.publicadas[caminho] = versao
+            # Só agora nenhuma sessão deste processo lê mais as cópias das versões anteriores
+            if PARQUET_DISPONIVEL:
+                descartar_versoes_antigas(caminho, versao)
+        self._assinaturas[caminho] = assinatura
+        return publicou
+
+    def run(self):
+        while True:
+            time.sleep(self.intervalo)
+            for caminho in list(self.publicadas):
+                try:
+                    if self.verificar(caminho):
+                        self.ultimo_erro = None
+                except Exception as e:  # planilha sendo copiada, removida etc.: tenta de novo depois
+                    self.ultimo_erro = (caminho, repr(e))
+
+
+@st.cache_resource(show_spinner=False)
+def monitor_planilhas():
+    monitor = MonitorPlanilhas()
+    monitor.start()
+    return monitor
+
+
+def versao_servida(caminho, chave=None, construir=None):
+    """Versão da planilha que as sessões devem usar (ver MonitorPlanilhas).
+
+    ``chave`` e ``construir`` registram o cache a refazer, fora das sessões, quando a
+    planilha mudar; a mesma chave registrada de novo só substitui a anterior.
+    """
+    return monitor_planilhas().versao(caminho, chave, construir)
@@ -0,0 +1,289 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from cache_colunar import _tipar_para_arrow, gravar_particoes, ler_particoes
+from cubo import construir_cubo, contagem_por_dia
+from dataset import ESTAGIOS_DESISTENCIA, preparar
+from esquema import aplicar_esquema
+from indice_temporal import comparar_janelas, construir_indice
+from perfilador import silenciar_streamlit
+from picos import DIMENSOES_PICOS, detectar_picos, grade_do_cubo, grade_semanal
+from previsao import previsoes_do_cubo
+from risco import ESTAGIOS_ENCERRADOS, pontuar_alunos, preparar_alunos, treinar_modelo
+
+# Uso:
+#   python benchmark.py                            (10 mil a 10 milhões de linhas)
+#   python benchmark.py --tamanhos 10000 100000 --excel
+#   python benchmark.py --comparar                 (compara com a última execução registrada)
+#
+# Cada medição vira uma linha em RESULTADOS (JSONL), para acompanhar regressões.
+
+TAMANHOS = [10_000, 100_000, 1_000_000, 10_000_000]
+RESULTADOS = 'benchmark_resultados.jsonl'
+
+# Planilha usada como modelo: as colunas sintéticas seguem a frequência dos valores dela
+MODELO = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfil_alunos_desistentes_limpo.xlsx')
+COLUNAS_MODELO = [
+    'estágio', 'motivo_da_desistência', 'estado', 'origem', 'sexo', 'faixa_etária',
+    'renda_familiar_mensal_aproximada', 'proprietário_do_matrícula', 'situação_de_emprego_atual',
+]
+PERIODO_DATAS = ('2022-08-01', '2026-03-31')
+# Janela da leitura particionada (últimos 12 meses do período)
+JANELA_PARTICOES = ('2025-04', '2026-03')
+
+# Limite de linhas de uma planilha Excel (uma linha fica para o cabeçalho)
+LIMITE_LINHAS_EXCEL = 1_048_575
+
+# Quando uma função passa deste tempo, os tamanhos maiores não a executam
+LIMITE_SEGUNDOS = 120
+# Acima desta razão (tempo atual / tempo anterior) a medição é marcada como regressão
+LIMIAR_REGRESSAO = 1.25
+
+
+class DadosSinteticos(dict):
+    """Faz o papel de DadosPagina (dados_alunos.py) com conjuntos já calculados."""
+
+    def __init__(self, conjuntos, versao):
+        super().__init__(conjuntos)
+        self.versao = versao
+
+
+def distribuicoes(caminho=MODELO):
+    """Valores e frequências de cada coluna do modelo (nulos incluídos)."""
+    modelo = pd.read_excel(caminho, usecols=COLUNAS_MODELO + ['idade'])
+    frequencias = {}
+    for col in COLUNAS_MODELO + ['idade']:
+        contagens = modelo[col].value_counts(dropna=False, normalize=True)
+        frequencias[col] = (contagens.index.to_numpy(dtype=object), contagens.to_numpy())
+    return frequencias
+
+
+def gerar_desistencias(n, frequencias, semente=0):
+    """DataFrame sintético no formato bruto da planilha (textos como vêm do Excel)."""
+    rng = np.random.default_rng(semente)
+    dados = {}
+    for col, (valores, pesos) in frequencias.items():
+        codigos = rng.choice(len(valores), size=n, p=pesos)
+        dados[col] = valores[codigos]
+
+    inicio, fim = (pd.Timestamp(d) for d in PERIODO_DATAS)
+    dias = rng.integers(0, (fim - inicio).days + 1, size=n)
+    datas = pd.Series(inicio + pd.to_timedelta(dias, unit='D'))
+    dados['data_de_desistência_do_curso'] = datas.dt.strftime('%d/%m/%Y').to_numpy()
+    dados['aluno'] = rng.integers(5_288_345_000_000_000_000, 5_288_345_999_999_999_999, size=n, dtype=np.int64)
+
+    # Mesmos tipos que o read_excel daria (textos, inteiros e floats)
+    return pd.DataFrame(dados).infer_objects()
+
+
+def _cronometrar(funcao, repeticoes):
+    # Melhor tempo entre as repetições; o resultado da última é devolvido
+    melhor, resultado = None, None
+    for _ in range(repeticoes):
+        gc.collect()
+        inicio = time.perf_counter()
+        resultado = funcao()
+        duracao = time.perf_counter() - inicio
+        melhor = duracao if melhor is None else min(melhor, duracao)
+    return melhor, resultado
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _funcoes_graficos():
+    silenciar_streamlit()
+
+    # Os módulos dos apps só expõem as funções quando importados (sem streamlit run)
+    import dados_alunos
+    import save
+
+    def grafico_save(funcao):
+        def construir(dados):
+            grafico = funcao(dados['cubo_desistencia'])
+            grafico = grafico[0] if isinstance(grafico, tuple) else grafico
+            return grafico.to_dict()
+        return construir
+
+    return {
+        'dados_alunos.intro': dados_alunos.intro,
+        'dados_alunos.desistencias': dados_alunos.desistencias,
+        'save.plot_desistencias_por_mes_altair': grafico_save(save.plot_desistencias_por_mes_altair),
+        'save.plot_desistencias_por_motivo_altair': grafico_save(save.plot_desistencias_por_motivo_altair),
+        'save.plot_desistencias_por_sexo_altair': grafico_save(save.plot_desistencias_por_sexo_altair),
+    }
+
+
+def medir_tamanho(n, frequencias, pasta, repeticoes=1, excel=False, pular=()):
+    """Mede carga, conversão, limpeza, agregação e gráficos para ``n`` linhas."""
+    medicoes = []
+
+    def medir(etapa, funcao_id, funcao):
+        if funcao_id in pular:
+            medicoes.append({'linhas': n, 'etapa': etapa, 'funcao': funcao_id, 'segundos': None, 'pulado': True})
+            return None
+        segundos, resultado = _cronometrar(funcao, repeticoes)
+        medicoes.append({'linhas': n, 'etapa': etapa, 'funcao': funcao_id, 'segundos': round(segundos, 6)})
+        print(f'  {etapa:<10} {funcao_id:<45} {segundos:10.3f} s')
+        return resultado
+
+    bruto = gerar_desistencias(n, frequencias)
+    arquivo_bruto = os.path.join(pasta, f'bruto-{n}.parquet')
+    _tipar_para_arrow(bruto).to_parquet(arquivo_bruto, index=False)
+
+    # Carga: a cópia colunar é o caminho normal; o Excel só cabe até ~1 milhão de linhas
+    if excel and n <= LIMITE_LINHAS_EXCEL:
+        arquivo_excel = os.path.join(pasta, f'bruto-{n}.xlsx')
+        bruto.to_excel(arquivo_excel, index=False)
+        medir('carga', 'pd.read_excel', lambda: pd.read_excel(arquivo_excel))
+    bruto = medir('carga', 'pd.read_parquet', lambda: pd.read_parquet(arquivo_bruto))
+
+    tipado = medir('conversao', 'esquema.aplicar_esquema', lambda: _tipar_para_arrow(aplicar_esquema(bruto)))
+    if tipado is None:
+        return medicoes
+    del bruto
+
+    # Leitura da cópia particionada por ano/mês: com janela, só as partições dela são abertas
+    pasta_particoes = os.path.join(pasta, f'particoes-{n}')
+    gravar_particoes(tipado, pasta_particoes)
+    medir('carga', 'cache_colunar.ler_particoes (tudo)', lambda: ler_particoes(pasta_particoes))
+    medir('carga', 'cache_colunar.ler_particoes (12 meses)',
+          lambda: ler_particoes(pasta_particoes, meses=JANELA_PARTICOES))
+
+    perfil = medir('limpeza', 'dataset.preparar', lambda: preparar(tipado, apenas_desistencias=False))
+    if perfil is None:
+        return medicoes
+    cubo = medir('agregacao', 'cubo.construir_cubo', lambda: construir_cubo(perfil))
+    diario = medir('agregacao', 'cubo.contagem_por_dia', lambda: contagem_por_dia(perfil))
+    indice = medir('agregacao', 'indice_temporal.construir_indice', lambda: construir_indice(perfil))
+    if cubo is None or diario is None or indice is None:
+        return medicoes
+    # Consulta de uma janela com variação: não deve crescer com o número de linhas
+    medir('agregacao', 'indice_temporal.comparar_janelas', lambda: comparar_janelas(
+        indice, 180, referencia=PERIODO_DATAS[1], medida='idade'
+    ))
+    picos = medir('agregacao', 'picos.detectar_picos', lambda: {
+        dimensao: detectar_picos(grade_do_cubo(cubo, dimensao, ['motivo_da_desistência']))
+        for dimensao in DIMENSOES_PICOS
+    })
+    if picos is None:
+        return medicoes
+    semanais = detectar_picos(grade_semanal(diario))
+    previsao = medir('agregacao', 'previsao.previsoes_do_cubo', lambda: previsoes_do_cubo(cubo))
+    if previsao is None:
+        return medicoes
+    # Risco: treino no histórico com desfecho e pontuação de toda a base como se estivesse ativa
+    com_desfecho = perfil[perfil['estágio'].isin(ESTAGIOS_ENCERRADOS)]
+    modelo = medir('agregacao', 'risco.treinar_modelo', lambda: treinar_modelo(
+        com_desfecho, com_desfecho['estágio'].isin(ESTAGIOS_DESISTENCIA)
+    ))
+    if modelo is not None:
+        medir('agregacao', 'risco.pontuar_alunos', lambda: pontuar_alunos(
+            modelo, preparar_alunos(tipado.drop(columns='estágio'))
+        ))
+
+    # Gráficos: versão nova a cada repetição, para não aproveitar o cache de specs
+    versoes = iter(range(1_000_000))
+    for funcao_id, funcao in _funcoes_graficos().items():
+        medir('graficos', funcao_id, lambda funcao=funcao: funcao(DadosSinteticos({
+            'perfil': perfil,
+            'cubo_perfil': cubo,
+            'cubo_desistencia': cubo,
+            'picos_perfil': detectar_picos(grade_do_cubo(cubo)),
+            'picos_periodo': picos,
+            'diario_perfil': diario,
+            'picos_semanais': semanais,
+            'indice_perfil': indice,
+            'previsao_desistencia': previsao,
+        }, versao=f'benchmark-{n}-{next(versoes)}')))
+
+    return medicoes
+
+
+def ultimas_medicoes(caminho):
+    """Última medição registrada para cada (linhas, função)."""
+    anteriores = {}
+    if not os.path.exists(caminho):
+        return anteriores
+    with open(caminho, encoding='utf-8') as f:
+        for linha in f:
+            registro = json.loads(linha)
+            if registro.get('segundos') is not None:
+                anteriores[(registro['linhas'], registro['funcao'])] = registro
+    return anteriores
+
+
+def comparar(medicoes, anteriores, limiar=LIMIAR_REGRESSAO):
+    regressoes = []
+    for medicao in medicoes:
+        anterior = anteriores.get((medicao['linhas'], medicao['funcao']))
+        if not anterior or medicao['segundos'] is None:
+            continue
+        razao = medicao['segundos'] / anterior['segundos'] if anterior['segundos'] else float('inf')
+        marca = '  <-- regressão' if razao > limiar else ''
+        print(f"{medicao['linhas']:>10} {medicao['funcao']:<45} {anterior['segundos']:9.3f} -> "
+              f"{medicao['segundos']:9.3f} s ({razao:.2f}x){marca}")
+        if razao > limiar:
+            regressoes.append(medicao)
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark das páginas com dados sintéticos de desistências.')
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=TAMANHOS)
+    parser.add_argument('--repeticoes', type=int, default=1)
+    parser.add_argument('--excel', action='store_true', help='também grava e lê .xlsx (lento para gravar)')
+    parser.add_argument('--limite', type=float, default=LIMITE_SEGUNDOS,
+                        help='segundos a partir dos quais a função não roda nos tamanhos maiores')
+    parser.add_argument('--saida', default=RESULTADOS)
+    parser.add_argument('--comparar', action='store_true', help='compara com a última execução registrada')
+    args = parser.parse_args(argv)
+
+    anteriores = ultimas_medicoes(args.saida) if args.comparar else {}
+    frequencias = distribuicoes()
+    execucao = {
+        'execucao': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_atual(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+    }
+
+    todas, pular = [], set()
+    with tempfile.TemporaryDirectory() as pasta:
+        for n in sorted(args.tamanhos):
+            print(f'{n:,} linhas')
+            medicoes = medir_tamanho(n, frequencias, pasta, args.repeticoes, args.excel, pular)
+            # Onde a função deixou de escalar, os tamanhos maiores não a executam
+            pular |= {m['funcao'] for m in medicoes if m['segundos'] is not None and m['segundos'] > args.limite}
+            with open(args.saida, 'a', encoding='utf-8') as f:
+                for medicao in medicoes:
+                    f.write(json.dumps({**execucao, **medicao}, ensure_ascii=False) + '\n')
+            todas.extend(medicoes)
+
+    if args.comparar:
+        print('\nComparação com a execução anterior:')
+        if comparar(todas, anteriores):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
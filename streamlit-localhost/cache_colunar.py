@@ -0,0 +1,511 @@
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from esquema import aplicar_esquema, alinhar_categorias, datas_invalidas, versao_esquema
+
+# O pyarrow é opcional: sem ele as planilhas continuam sendo lidas direto do Excel
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+# Pasta onde ficam as cópias colunares das planilhas
+PASTA_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache_dados')
+
+# Chave de negócio das linhas: usada para classificar o que mudou entre versões
+CHAVE_LINHA = ['proprietário_do_matrícula', 'data_de_desistência_do_curso']
+
+# Coluna que marca, no arquivo de delta, se a linha entrou (+1) ou saiu (-1)
+COLUNA_SINAL = '_sinal'
+
+# Cópia particionada (estilo Hive: ano=2024/mes=10/...) pela data da desistência:
+# leituras de uma janela de meses só abrem os arquivos desses meses
+COLUNA_DATA = 'data_de_desistência_do_curso'
+COLUNAS_PARTICAO = ['ano', 'mes']
+# Partições adicionais depois do mês (ex.: ['estado'])
+PARTICOES_EXTRAS = []
+# Linhas por grupo nos arquivos das partições: sem isso cada lote do DataFrame vira
+# um grupo pequeno em cada partição, e a leitura fica várias vezes mais lenta
+LINHAS_POR_GRUPO = 1 << 20
+
+# Cópias colunares mantidas por planilha: a versão publicada (ver atualizacao.py) nunca
+# é apagada, e as mais novas que ela ficam para os processos que ainda não a trocaram
+MAX_VERSOES_COLUNARES = 4
+
+
+class VersaoIndisponivel(FileNotFoundError):
+    """A cópia colunar da versão pedida não existe mais e a planilha já está em outra versão."""
+
+
+def hash_arquivo(caminho, tamanho_bloco=1 << 20):
+    h = hashlib.sha256()
+    with open(caminho, 'rb') as f:
+        for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def hash_linhas(df):
+    """Identifica cada linha pelo hash do conteúdo e pela ocorrência (linhas repetidas)."""
+    hashes = pd.util.hash_pandas_object(df, index=False)
+    linhas = pd.DataFrame({
+        'hash': hashes.to_numpy(),
+        'ocorrencia': hashes.groupby(hashes).cumcount().to_numpy(),
+    })
+    if all(col in df.columns for col in CHAVE_LINHA):
+        linhas['chave'] = pd.util.hash_pandas_object(df[CHAVE_LINHA], index=False).to_numpy()
+    return linhas
+
+
+def _caminho_manifesto(caminho):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return os.path.join(PASTA_CACHE, f'{nome}.json')
+
+
+def _ler_manifesto(caminho):
+    try:
+        with open(_caminho_manifesto(caminho), encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _gravar_atomico(destino, escrever):
+    # Grava num arquivo temporário e troca de uma vez, para que outro worker
+    # nunca leia um arquivo pela metade
+    temporario = f'{destino}.{os.getpid()}.tmp'
+    escrever(temporario)
+    os.replace(temporario, destino)
+
+
+def _caminho_manifesto_versao(manifesto):
+    # Manifesto de cada versão, ao lado das cópias dela (mesmo nome, sem o .parquet)
+    return os.path.join(PASTA_CACHE, f"{manifesto['parquet'][:-len('.parquet')]}.json")
+
+
+def _base(caminho, sha256):
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return os.path.join(PASTA_CACHE, f'{nome}-{sha256[:16]}-{versao_esquema()}')
+
+
+def _gravar_manifesto(caminho, manifesto):
+    """Grava o manifesto da planilha (última versão convertida) e o da própria versão."""
+    def escrever(tmp):
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False)
+
+    _gravar_atomico(_caminho_manifesto_versao(manifesto), escrever)
+    _gravar_atomico(_caminho_manifesto(caminho), escrever)
+
+
+def _ler_manifesto_versao(caminho, versao):
+    try:
+        with open(f'{_base(caminho, versao)}.json', encoding='utf-8') as f:
+            manifesto = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    if manifesto.get('sha256') != versao or not os.path.exists(os.path.join(PASTA_CACHE, manifesto['parquet'])):
+        return None
+    return manifesto
+
+
+def versao_planilha(caminho):
+    """Retorna o hash do conteúdo da planilha, usando o mtime para evitar recalcular."""
+    info = os.stat(caminho)
+    manifesto = _ler_manifesto(caminho)
+    if manifesto and manifesto['mtime_ns'] == info.st_mtime_ns and manifesto['tamanho'] == info.st_size:
+        return manifesto['sha256']
+    return hash_arquivo(caminho)
+
+
+def _projecao(disponiveis, colunas):
+    # Colunas pedidas que existem no arquivo, na ordem em que estão gravadas
+    pedidas = set(colunas)
+    return [col for col in disponiveis if col in pedidas]
+
+
+def normalizar_janela(meses):
+    """Janela ``(inicio, fim)`` como textos 'AAAA-MM' (ou None em cada ponta), usável como chave de cache."""
+    if meses is None:
+        return None
+    return tuple(None if m is None else str(pd.Period(m, freq='M')) for m in meses)
+
+
+def no_intervalo(datas, meses):
+    """Máscara das datas dentro da janela de meses (datas vazias ficam de fora)."""
+    inicio, fim = normalizar_janela(meses)
+    periodos = datas.dt.to_period('M')
+    manter = periodos.notna()
+    if inicio is not None:
+        manter &= periodos >= pd.Period(inicio, freq='M')
+    if fim is not None:
+        manter &= periodos <= pd.Period(fim, freq='M')
+    return manter.to_numpy(dtype=bool)
+
+
+def _numero_mes(mes):
+    periodo = pd.Period(mes, freq='M')
+    return periodo.year * 12 + periodo.month
+
+
+def gravar_particoes(df, destino):
+    """Grava ``df`` particionado por ano/mês de COLUNA_DATA (linhas sem data ficam na partição nula)."""
+    datas = df[COLUNA_DATA]
+    tabela = pa.Table.from_pandas(
+        df.assign(ano=datas.dt.year.astype('Int16'), mes=datas.dt.month.astype('Int8')), preserve_index=False
+    )
+    pq.write_to_dataset(
+        tabela, destino, partition_cols=[*COLUNAS_PARTICAO, *PARTICOES_EXTRAS],
+        min_rows_per_group=LINHAS_POR_GRUPO, max_rows_per_group=LINHAS_POR_GRUPO,
+    )
+
+
+def ler_particoes(destino, colunas=None, meses=None):
+    """Lê a cópia particionada, abrindo só as partições dos meses da janela ``(inicio, fim)``."""
+    dataset = ds.dataset(destino, format='parquet', partitioning='hive')
+    disponiveis = [col for col in dataset.schema.names if col not in COLUNAS_PARTICAO]
+    filtro = None
+    if meses is not None:
+        # Mês como número (ano * 12 + mês): o filtro é resolvido pelos nomes das pastas,
+        # e a partição sem data nunca entra
+        inicio, fim = normalizar_janela(meses)
+        mes = ds.field('ano') * 12 + ds.field('mes')
+        filtro = ds.field('ano').is_valid()
+        if inicio is not None:
+            filtro &= mes >= _numero_mes(inicio)
+        if fim is not None:
+            filtro &= mes <= _numero_mes(fim)
+    tabela = dataset.to_table(columns=disponiveis if colunas is None else _projecao(disponiveis, colunas), filter=filtro)
+    return tabela.to_pandas()
+
+
+def _tipar_para_arrow(df):
+    # Colunas com tipos misturados (ex.: números e textos) não viram Arrow;
+    # nesses casos guardamos como texto, preservando os valores nulos
+    df = df.copy()
+    for col in df.columns:
+        if df[col].dtype == object:
+            nao_nulos = df[col].dropna()
+            if nao_nulos.map(type).nunique() > 1:
+                df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+    return df
+
+
+def _versao_anterior(manifesto):
+    # Cópia colunar e hashes da versão anterior, se ainda servirem de base para o delta
+    if not manifesto or manifesto.get('esquema') != versao_esquema() or not manifesto.get('linhas'):
+        return None
+    try:
+        return (pd.read_parquet(os.path.join(PASTA_CACHE, manifesto['parquet'])),
+                pd.read_parquet(os.path.join(PASTA_CACHE, manifesto['linhas'])))
+    except (FileNotFoundError, OSError):
+        return None
+
+
+def _ajustar_tipos(novo, referencia):
+    # As linhas novas são poucas: a inferência de tipos pode divergir da cópia já gravada
+    for col in referencia.columns:
+        tipo = referencia[col].dtype
+        if novo[col].dtype == tipo:
+            continue
+        if isinstance(tipo, pd.CategoricalDtype):
+            novo[col] = novo[col].astype('category')
+        else:
+            novo[col] = novo[col].astype(tipo)
+    return novo
+
+
+def _mesclar(bruto, linhas, antigo, linhas_antigas):
+    """Monta a nova cópia colunar reaproveitando as linhas que não mudaram.
+
+    Retorna (df, delta, resumo) ou None quando não dá para aproveitar a versão anterior.
+    """
+    if list(bruto.columns) != list(antigo.columns) or len(linhas_antigas) != len(antigo):
+        return None
+
+    identificacao = ['hash', 'ocorrencia']
+    posicao_antiga = pd.Series(
+        np.arange(len(linhas_antigas)), index=pd.MultiIndex.from_frame(linhas_antigas[identificacao])
+    )
+    posicoes = posicao_antiga.reindex(pd.MultiIndex.from_frame(linhas[identificacao])).to_numpy()
+    novas = np.isnan(posicoes)
+    if novas.all():
+        return None
+    mantidas = posicoes[~novas].astype(int)
+    removidas = np.setdiff1d(np.arange(len(antigo)), mantidas)
+
+    try:
+        # Só as linhas novas passam pelo esquema
+        adicionadas = _ajustar_tipos(_tipar_para_arrow(aplicar_esquema(bruto[novas])), antigo)
+        mantidas_df, adicionadas, removidas_df = alinhar_categorias(
+            antigo.iloc[mantidas], adicionadas, antigo.iloc[removidas]
+        )
+    except (TypeError, ValueError):
+        return None
+
+    # Mantém a ordem das linhas da planilha nova
+    df = pd.concat([
+        mantidas_df.set_axis(np.flatnonzero(~novas)),
+        adicionadas.set_axis(np.flatnonzero(novas)),
+    ]).sort_index().reset_index(drop=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+
+    delta = pd.concat([
+        removidas_df.assign(**{COLUNA_SINAL: np.int8(-1)}),
+        adicionadas.assign(**{COLUNA_SINAL: np.int8(1)}),
+    ], ignore_index=True)
+
+    # Linhas cuja chave aparece nas duas listas foram alteradas, não incluídas/removidas
+    resumo = {'novas': int(novas.sum()), 'removidas': len(removidas), 'alteradas': 0}
+    if 'chave' in linhas.columns and 'chave' in linhas_antigas.columns:
+        alteradas = np.intersect1d(linhas['chave'].to_numpy()[novas], linhas_antigas['chave'].to_numpy()[removidas])
+        resumo['alteradas'] = len(alteradas)
+    return df, delta, resumo
+
+
+def _converter(caminho, info, manifesto=None):
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    # O hash sai dos mesmos bytes que são convertidos: se a planilha for trocada no meio,
+    # a cópia fica com a versão que de fato foi lida
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    sha256 = hashlib.sha256(conteudo).hexdigest()
+    base = _base(caminho, sha256)
+    arquivo_parquet = f'{base}.parquet'
+    arquivo_linhas = f'{base}.linhas.parquet'
+    arquivo_delta = f'{base}.delta.parquet'
+    pasta_particoes = f'{base}.particoes'
+
+    bruto = pd.read_excel(io.BytesIO(conteudo))
+    del conteudo
+    linhas = hash_linhas(bruto)
+
+    # Com a versão anterior em disco, só as linhas novas ou alteradas são convertidas
+    mescla = None
+    anterior = _versao_anterior(manifesto) if manifesto and manifesto['sha256'] != sha256 else None
+    if anterior is not None:
+        mescla = _mesclar(bruto, linhas, *anterior)
+    if mescla is not None:
+        df, delta, resumo = mescla
+    else:
+        df, delta, resumo = _tipar_para_arrow(aplicar_esquema(bruto)), None, None
+
+    if not os.path.exists(arquivo_parquet):
+        _gravar_atomico(arquivo_parquet, lambda tmp: df.to_parquet(tmp, index=False))
+    _gravar_atomico(arquivo_linhas, lambda tmp: linhas.to_parquet(tmp, index=False))
+    if delta is not None:
+        _gravar_atomico(arquivo_delta, lambda tmp: delta.to_parquet(tmp, index=False))
+    particoes = _gravar_particoes(df, pasta_particoes)
+
+    # As cópias das versões anteriores ficam até a nova ser publicada (ver descartar_versoes_antigas)
+    _gravar_manifesto(caminho, {
+        'origem': os.path.abspath(caminho),
+        'mtime_ns': info.st_mtime_ns,
+        'tamanho': info.st_size,
+        'sha256': sha256,
+        'esquema': versao_esquema(),
+        'parquet': os.path.basename(arquivo_parquet),
+        'linhas': os.path.basename(arquivo_linhas),
+        # Versão de onde veio o delta (entradas e saídas de linhas) desta versão
+        'anterior': manifesto['sha256'] if delta is not None else None,
+        'delta': os.path.basename(arquivo_delta) if delta is not None else None,
+        'resumo_delta': resumo,
+        'particoes': particoes,
+        # Datas preenchidas na planilha que não seguiam o formato (viraram NaT)
+        'datas_invalidas': datas_invalidas(bruto, df),
+    })
+    return df
+
+
+def descartar_versoes_antigas(caminho, publicada, manter=MAX_VERSOES_COLUNARES):
+    """Apaga as cópias das versões anteriores à ``publicada``, deixando as ``manter`` mais recentes.
+
+    Chamado depois que uma versão nova é publicada: até lá as sessões ainda leem a anterior.
+    """
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    padrao = re.compile(rf'^{re.escape(nome)}-[0-9a-f]{{16}}-[0-9a-f]+(?=\.)')
+    versoes = {}
+    try:
+        for arquivo in os.listdir(PASTA_CACHE):
+            encontrado = padrao.match(arquivo)
+            if encontrado and not arquivo.endswith('.tmp'):
+                caminho_arquivo = os.path.join(PASTA_CACHE, arquivo)
+                versoes.setdefault(encontrado.group(0), []).append((os.path.getmtime(caminho_arquivo), caminho_arquivo))
+    except OSError:  # pasta removida ou arquivo apagado por outro processo: fica para a próxima
+        return
+
+    ordem = sorted(versoes, key=lambda base: max(versoes[base]), reverse=True)
+    base_publicada = os.path.basename(_base(caminho, publicada))
+    if base_publicada not in versoes:
+        return
+    # Só as versões mais antigas que a publicada, e além das ``manter`` mais recentes
+    descartar = ordem[max(ordem.index(base_publicada) + 1, manter):]
+    for base in descartar:
+        for _, arquivo in versoes[base]:
+            try:
+                if os.path.isdir(arquivo):
+                    shutil.rmtree(arquivo)
+                else:
+                    os.remove(arquivo)
+            except OSError:
+                pass
+
+
+def _gravar_particoes(df, destino):
+    # Planilhas sem a coluna de data (ou que não viram Arrow) ficam só com a cópia inteira
+    if COLUNA_DATA not in df.columns or not pd.api.types.is_datetime64_any_dtype(df[COLUNA_DATA]):
+        return None
+    if not os.path.exists(destino):
+        try:
+            _gravar_atomico(destino, lambda tmp: gravar_particoes(df, tmp))
+        except (OSError, TypeError, ValueError, pa.ArrowException):
+            return None
+    return os.path.basename(destino)
+
+
+def _sincronizar(caminho):
+    """Garante que a cópia colunar corresponde à planilha atual.
+
+    Retorna o manifesto e, quando houve conversão agora, o DataFrame convertido.
+    """
+    info = os.stat(caminho)
+    manifesto = _ler_manifesto(caminho)
+    mesmo_arquivo = manifesto and manifesto['mtime_ns'] == info.st_mtime_ns and manifesto['tamanho'] == info.st_size
+
+    if not mesmo_arquivo:
+        sha256 = hash_arquivo(caminho)
+        if not manifesto or manifesto['sha256'] != sha256:
+            df = _converter(caminho, info, manifesto)
+            return _ler_manifesto(caminho), df
+        # Só o mtime mudou (ex.: arquivo copiado de novo); o conteúdo é o mesmo
+        manifesto.update(mtime_ns=info.st_mtime_ns, tamanho=info.st_size)
+
+    arquivo_parquet = os.path.join(PASTA_CACHE, manifesto['parquet'])
+    if manifesto.get('esquema') != versao_esquema() or not os.path.exists(arquivo_parquet):
+        df = _converter(caminho, info)
+        return _ler_manifesto(caminho), df
+    if 'particoes' not in manifesto:
+        # Cópia de antes das partições: elas saem do próprio Parquet, sem reler o Excel
+        pasta_particoes = f"{arquivo_parquet[:-len('.parquet')]}.particoes"
+        manifesto['particoes'] = _gravar_particoes(pd.read_parquet(arquivo_parquet), pasta_particoes)
+        mesmo_arquivo = False
+    if not os.path.exists(_caminho_manifesto_versao(manifesto)):
+        # Cópia de antes dos manifestos por versão
+        mesmo_arquivo = False
+    if not mesmo_arquivo:
+        _gravar_manifesto(caminho, manifesto)
+    return manifesto, None
+
+
+def _copia(caminho, versao):
+    """Manifesto da cópia colunar de ``versao`` (None: a versão da planilha agora).
+
+    Retorna também o DataFrame, quando a cópia teve de ser convertida nesta chamada. Uma
+    versão sem cópia só é convertida se a planilha ainda estiver nela; senão as linhas de
+    outra versão acabariam guardadas com o nome desta.
+    """
+    if versao is not None:
+        manifesto = _ler_manifesto_versao(caminho, versao)
+        if manifesto is not None:
+            return manifesto, None
+    manifesto, df = _sincronizar(caminho)
+    if versao is not None and manifesto['sha256'] != versao:
+        raise VersaoIndisponivel(f"A cópia colunar de {caminho} na versão {versao[:16]} não existe mais.")
+    return manifesto, df
+
+
+def _ler_excel(caminho, usecols, versao):
+    # Sem pyarrow não há cópias: a versão pedida só pode ser a que está no arquivo
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    if versao is not None and hashlib.sha256(conteudo).hexdigest() != versao:
+        raise VersaoIndisponivel(f"{caminho} não está mais na versão {versao[:16]}.")
+    return pd.read_excel(io.BytesIO(conteudo), usecols=usecols)
+
+
+def _filtrar_janela(df, colunas, meses):
+    # Caminhos sem a cópia particionada: lê tudo e filtra as linhas em memória
+    if meses is not None:
+        df = df[no_intervalo(df[COLUNA_DATA], meses)].reset_index(drop=True)
+    return df if colunas is None else df[_projecao(df.columns, colunas)]
+
+
+def ler_planilha(caminho, colunas=None, meses=None, versao=None):
+    """Lê a planilha pela cópia Parquet, convertendo o Excel só quando ele (ou o esquema) mudar.
+
+    Em ambos os caminhos as colunas já chegam com os tipos declarados em esquema.py.
+    ``colunas`` restringe a leitura a essas colunas (as que a planilha não tem são
+    ignoradas); a conversão do Excel continua guardando todas. ``meses`` é uma janela
+    ``(inicio, fim)`` de meses ('AAAA-MM', pontas None em aberto) da data da desistência:
+    só as partições desses meses são lidas e as linhas sem data ficam de fora.
+    ``versao`` (hash da planilha) lê exatamente a cópia dessa versão, mesmo que o arquivo
+    já tenha sido trocado; os caches chaveados pela versão publicada sempre a passam.
+    """
+    if meses is not None and colunas is not None:
+        colunas_lidas = [*colunas, COLUNA_DATA]
+    else:
+        colunas_lidas = colunas
+
+    if not PARQUET_DISPONIVEL:
+        usecols = None if colunas_lidas is None else lambda col: col.strip().lower().replace(" ", "_") in set(colunas_lidas)
+        return _filtrar_janela(aplicar_esquema(_ler_excel(caminho, usecols, versao)), colunas, meses)
+
+    manifesto, df = _copia(caminho, versao)
+    if df is not None:
+        return _filtrar_janela(df, colunas, meses)
+    # Janela aberta nas duas pontas: o arquivo único é mais barato que abrir todas as partições
+    if meses is not None and any(normalizar_janela(meses)) and manifesto.get('particoes'):
+        try:
+            return ler_particoes(os.path.join(PASTA_CACHE, manifesto['particoes']), colunas, meses)
+        except (FileNotFoundError, OSError):
+            pass
+    arquivo_parquet = os.path.join(PASTA_CACHE, manifesto['parquet'])
+    if colunas_lidas is not None:
+        # Só o rodapé do arquivo é lido para saber quais colunas ele tem
+        colunas_lidas = _projecao(pq.read_schema(arquivo_parquet).names, colunas_lidas)
+    return _filtrar_janela(pd.read_parquet(arquivo_parquet, columns=colunas_lidas), colunas, meses)
+
+
+def relatorio_datas(caminho):
+    """Quantas datas de cada coluna não puderam ser lidas na última conversão da planilha
+    (None se a cópia colunar é de antes dessa contagem)."""
+    if not PARQUET_DISPONIVEL:
+        bruto = pd.read_excel(caminho)
+        return datas_invalidas(bruto, aplicar_esquema(bruto))
+    manifesto, _ = _sincronizar(caminho)
+    return manifesto.get('datas_invalidas')
+
+
+def ler_delta(caminho, colunas=None, versao=None):
+    """Linhas que entraram (+1) e saíram (-1) na mudança que levou a planilha à ``versao``
+    (None: a versão atual).
+
+    Retorna (versão anterior, versão, DataFrame com a coluna COLUNA_SINAL), ou None
+    quando a versão não veio de uma atualização incremental. ``colunas`` funciona
+    como em ler_planilha.
+    """
+    if not PARQUET_DISPONIVEL:
+        return None
+    manifesto, _ = _copia(caminho, versao)
+    if not manifesto.get('delta'):
+        return None
+    arquivo_delta = os.path.join(PASTA_CACHE, manifesto['delta'])
+    try:
+        if colunas is not None:
+            colunas = _projecao(pq.read_schema(arquivo_delta).names, [*colunas, COLUNA_SINAL])
+        delta = pd.read_parquet(arquivo_delta, columns=colunas)
+    except (FileNotFoundError, OSError):
+        return None
+    return manifesto['anterior'], manifesto['sha256'], delta
@@ -0,0 +1,62 @@
+import json
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+from perfilador import ativo, registrar_payload, secao
+
+# Quantos gráficos serializados ficam guardados por processo
+MAX_GRAFICOS = 64
+
+
+class CacheGraficos:
+    """Guarda specs Vega-Lite já serializadas, descartando as menos usadas (LRU)."""
+
+    def __init__(self, capacidade=MAX_GRAFICOS):
+        self.capacidade = capacidade
+        self._specs = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave, construir):
+        with self._trava:
+            if chave in self._specs:
+                self._specs.move_to_end(chave)
+                return self._specs[chave]
+
+        # A serialização fica fora da trava para não bloquear outras sessões
+        spec = construir().to_dict()
+
+        with self._trava:
+            self._specs[chave] = spec
+            self._specs.move_to_end(chave)
+            while len(self._specs) > self.capacidade:
+                self._specs.popitem(last=False)
+        return spec
+
+    def __len__(self):
+        return len(self._specs)
+
+
+@st.cache_resource(show_spinner=False)
+def cache_graficos():
+    # Um único cache por processo, compartilhado por todas as sessões
+    return CacheGraficos()
+
+
+def spec_grafico(id_grafico, versao, construir, **parametros):
+    """Retorna a spec do gráfico, chamando ``construir`` (que devolve um gráfico Altair)
+    só quando a combinação (versão dos dados, id do gráfico, parâmetros) é nova."""
+    chave = (versao, id_grafico, tuple(sorted(parametros.items())))
+    return cache_graficos().obter(chave, construir)
+
+
+def exibir_grafico(id_grafico, versao, construir, use_container_width=True, **parametros):
+    """Mesmo que st.altair_chart, mas reaproveitando a spec serializada do cache."""
+    with secao(id_grafico, 'grafico'):
+        with secao(f'{id_grafico}: spec', 'serializacao'):
+            spec = spec_grafico(id_grafico, versao, construir, **parametros)
+        with secao(f'{id_grafico}: envio', 'envio'):
+            if ativo():
+                registrar_payload(len(json.dumps(spec, default=str).encode('utf-8')))
+            st.vega_lite_chart(spec, use_container_width=use_container_width)
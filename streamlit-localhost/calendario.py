@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from dataset import compartilhar
+
+# Dimensão de calendário: um registro por mês, com os rótulos e chaves usados
+# pelos gráficos. As páginas consultam a tabela em vez de formatar textos.
+
+MESES_PT = [
+    'Janeiro', 'Fevereiro', 'Março', 'Abril', 'Maio', 'Junho',
+    'Julho', 'Agosto', 'Setembro', 'Outubro', 'Novembro', 'Dezembro'
+]
+MESES_PT_ABREV = ['Jan', 'Fev', 'Mar', 'Abr', 'Mai', 'Jun', 'Jul', 'Ago', 'Set', 'Out', 'Nov', 'Dez']
+
+# Meses cobertos pela tabela
+CALENDARIO_INICIO = '2000-01'
+CALENDARIO_FIM = '2099-12'
+
+# Primeiro mês do segundo semestre letivo (período "ano.2")
+INICIO_SEGUNDO_SEMESTRE = 7
+
+
+def construir_calendario(inicio=CALENDARIO_INICIO, fim=CALENDARIO_FIM):
+    """Tabela indexada pelo mês (Period) com rótulos pt-BR, chave de ordenação,
+    trimestre, período letivo e o primeiro dia do mês."""
+    periodos = pd.period_range(inicio, fim, freq='M', name='ano_mes')
+    anos, meses = np.asarray(periodos.year), np.asarray(periodos.month)
+    ano_curto = pd.Series(anos % 100).astype(str).str.zfill(2).to_numpy()
+    return pd.DataFrame({
+        'ano': anos,
+        'mes': meses,
+        # 'Janeiro/23' e 'Jan/2023'
+        'rotulo': np.asarray(MESES_PT, dtype=object)[meses - 1] + '/' + ano_curto,
+        'rotulo_curto': np.asarray(MESES_PT_ABREV, dtype=object)[meses - 1] + '/' + anos.astype(str).astype(object),
+        # Meses desde 1970: ordena os rótulos sem precisar interpretá-los
+        'ordem': periodos.asi8,
+        'trimestre': np.asarray(periodos.quarter),
+        'periodo_letivo': anos.astype(str).astype(object) + np.where(meses < INICIO_SEGUNDO_SEMESTRE, '.1', '.2'),
+        'inicio': periodos.to_timestamp(),
+    }, index=periodos)
+
+
+@st.cache_resource(show_spinner=False)
+def _calendario():
+    return construir_calendario()
+
+
+def calendario():
+    """Calendário compartilhado entre as sessões (montado uma única vez)."""
+    return compartilhar(_calendario())
+
+
+def rotular(periodos, campo='rotulo'):
+    """Valor do campo do calendário para cada mês, na ordem recebida."""
+    return calendario()[campo].reindex(pd.PeriodIndex(periodos, freq='M')).to_numpy()
+
+
+def rotulos_em_ordem(periodos, campo='rotulo'):
+    """Rótulos distintos dos meses, em ordem cronológica (para o ``sort`` dos eixos)."""
+    cal = calendario()
+    meses = cal[cal.index.isin(pd.PeriodIndex(periodos, freq='M'))]
+    return meses.sort_values('ordem')[campo].drop_duplicates().tolist()
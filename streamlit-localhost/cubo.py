@@ -0,0 +1,155 @@
+import threading
+
+import pandas as pd
+import streamlit as st
+
+from armazem import compartilhado
+from atualizacao import versao_servida
+from cache_colunar import COLUNA_SINAL, ler_delta, ler_planilha, normalizar_janela
+from dataset import COLUNAS_CATEGORICAS, DERIVADAS, MAX_VERSOES_CACHE, colunas_necessarias, compartilhar, preparar
+from esquema import alinhar_categorias
+from perfilador import medir
+
+# Dimensões usadas pelos gráficos; o cubo guarda a contagem de cada combinação
+DIMENSOES_CUBO = [
+    'ano_mes', 'estado', 'origem', 'sexo', 'faixa_etária',
+    'motivo_da_desistência', 'faixa_renda_familiar'
+]
+
+# Colunas lidas da planilha para cada agregado (as demais nem saem do disco)
+COLUNAS_CUBO = colunas_necessarias([d for d in DIMENSOES_CUBO if d not in DERIVADAS], DERIVADAS)
+COLUNAS_DIARIA = colunas_necessarias([], ())
+
+# Janela de meses ('AAAA-MM', 'AAAA-MM') dos gráficos mensais dos apps (save.py e
+# dados_alunos.py): só as partições desses meses são lidas (None: todo o histórico)
+JANELA_MENSAL = None
+
+
+def construir_cubo(df, dimensoes=DIMENSOES_CUBO):
+    """Agrega o DataFrame em contagens por combinação de dimensões (nulos incluídos)."""
+    dimensoes = [d for d in dimensoes if d in df.columns]
+    return df.groupby(dimensoes, observed=True, dropna=False).size().reset_index(name='quantidade')
+
+
+@medir('agregacao')
+def fatiar(cubo, dimensoes, filtros=None, sem_nulos=()):
+    """Soma o cubo nas dimensões pedidas.
+
+    ``filtros`` restringe colunas a uma lista de valores e ``sem_nulos`` descarta as
+    linhas onde essas colunas estão vazias. Assim como num groupby comum, linhas
+    com alguma dimensão pedida vazia não entram no resultado.
+    """
+    fatia = cubo
+    for col, valores in (filtros or {}).items():
+        fatia = fatia[fatia[col].isin(valores)]
+    for col in sem_nulos:
+        fatia = fatia[fatia[col].notna()]
+    return fatia.groupby(dimensoes, observed=True)['quantidade'].sum().reset_index()
+
+
+@medir('agregacao')
+def contagem_ordenada(cubo, dimensao, **kwargs):
+    """Equivalente ao value_counts de uma coluna, calculado a partir do cubo."""
+    return fatiar(cubo, [dimensao], **kwargs).sort_values('quantidade', ascending=False, ignore_index=True)
+
+
+def contagem_por_dia(df, coluna='data_de_desistência_do_curso'):
+    return df.groupby(coluna).size().reset_index(name='quantidade')
+
+
+def somar_contagens(anterior, variacao):
+    """Soma duas tabelas de contagens com as mesmas dimensões (a variação pode ser negativa)."""
+    dimensoes = [col for col in anterior.columns if col != 'quantidade']
+    anterior, variacao = alinhar_categorias(anterior, variacao)
+    total = pd.concat([anterior, variacao], ignore_index=True)
+    total = total.groupby(dimensoes, observed=True, dropna=False)['quantidade'].sum().reset_index()
+    total = total[total['quantidade'] != 0].reset_index(drop=True)
+    for col in dimensoes:
+        if col in COLUNAS_CATEGORICAS and isinstance(total[col].dtype, pd.CategoricalDtype):
+            total[col] = total[col].cat.remove_unused_categories()
+    return total
+
+
+def variacao_contagens(delta, agregar, apenas_desistencias, derivadas):
+    """Contagens das linhas que entraram menos as das que saíram da planilha."""
+    partes = []
+    for sinal in (1, -1):
+        linhas = delta[delta[COLUNA_SINAL] == sinal].drop(columns=COLUNA_SINAL)
+        contagens = agregar(preparar(linhas, apenas_desistencias, derivadas))
+        partes.append(contagens.assign(quantidade=contagens['quantidade'] * sinal))
+    return pd.concat(alinhar_categorias(*partes), ignore_index=True)
+
+
+@st.cache_resource(show_spinner=False)
+def _agregados_recentes():
+    # Último resultado de cada agregado, ponto de partida da próxima atualização incremental;
+    # sessões e o monitor de planilhas o leem e atualizam ao mesmo tempo, sempre com a trava
+    return {}, threading.Lock()
+
+
+def _agregado_incremental(nome, caminho, versao, apenas_desistencias, agregar, derivadas, colunas, meses=None):
+    """Atualiza o agregado só com o delta da planilha quando a versão anterior está em memória;
+    caso contrário (primeira carga, várias mudanças seguidas etc.) recalcula tudo.
+
+    Com uma janela de ``meses`` o agregado sai só das partições desses meses (o delta
+    não é particionado, então a janela é sempre recalculada).
+    Quando outro processo já montou esta versão, o resultado só é mapeado (ver armazem.py).
+    """
+    recentes, trava = _agregados_recentes()
+    chave = (nome, caminho, apenas_desistencias)
+    with trava:
+        anterior = recentes.get(chave) if meses is None else None
+
+    def calcular():
+        delta = ler_delta(caminho, colunas, versao) if anterior else None
+        if delta is not None and delta[0] == anterior[0] and delta[1] == versao:
+            variacao = variacao_contagens(delta[2], agregar, apenas_desistencias, derivadas)
+            return somar_contagens(anterior[1], variacao)
+        return agregar(preparar(ler_planilha(caminho, colunas, meses, versao), apenas_desistencias, derivadas))
+
+    if meses is None:
+        resultado = compartilhado(nome, (caminho, apenas_desistencias), versao, calcular)
+        with trava:
+            recentes[chave] = (versao, resultado)
+    else:
+        resultado = compartilhado(nome, (caminho, apenas_desistencias, meses), versao, calcular)
+    return resultado
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _cubo_desistencias(caminho, versao, apenas_desistencias, meses=None):
+    # O DataFrame com todas as colunas derivadas só existe durante a montagem do cubo
+    return _agregado_incremental(
+        'cubo', caminho, versao, apenas_desistencias, construir_cubo, DERIVADAS, COLUNAS_CUBO, meses
+    )
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _contagem_diaria(caminho, versao, apenas_desistencias, meses=None):
+    return _agregado_incremental(
+        'diaria', caminho, versao, apenas_desistencias, contagem_por_dia, (), COLUNAS_DIARIA, meses
+    )
+
+
+def cubo_desistencias(caminho='desistencia.xlsx', apenas_desistencias=True, meses=None):
+    """Cubo de contagens da planilha, recalculado (em segundo plano) só quando ela muda.
+
+    ``meses`` restringe o cubo a uma janela ``(inicio, fim)`` de meses, lendo só as
+    partições desses meses (None: todo o histórico).
+    """
+    meses = normalizar_janela(meses)
+    versao = versao_servida(
+        caminho, ('cubo', apenas_desistencias, meses),
+        lambda nova: _cubo_desistencias(caminho, nova, apenas_desistencias, meses)
+    )
+    return compartilhar(_cubo_desistencias(caminho, versao, apenas_desistencias, meses))
+
+
+def contagem_diaria(caminho='desistencia.xlsx', apenas_desistencias=True, meses=None):
+    """Desistências por dia (para a linha do tempo), com o mesmo cache e a mesma janela do cubo."""
+    meses = normalizar_janela(meses)
+    versao = versao_servida(
+        caminho, ('diaria', apenas_desistencias, meses),
+        lambda nova: _contagem_diaria(caminho, nova, apenas_desistencias, meses)
+    )
+    return compartilhar(_contagem_diaria(caminho, versao, apenas_desistencias, meses))
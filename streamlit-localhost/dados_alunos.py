@@ -2,11 +2,20 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 import os
-import time
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
-from datetime import datetime, timedelta
+from atualizacao import versao_servida
+from cache_colunar import relatorio_datas
+from cubo import JANELA_MENSAL, contagem_diaria, contagem_ordenada, cubo_desistencias, fatiar
+from cache_graficos import exibir_grafico
+from calendario import rotular
+from indice_temporal import comparar_janelas, indice_desistencias
+from picos import DIMENSOES_PICOS, picos_mensais, picos_semanais
+from previsao import camadas_previsao, previsoes
+from risco import MINIMO_POR_CLASSE, modelo_risco, riscos_alunos
+from perfilador import CHAVE_ATIVO, ativo, finalizar_execucao, fragmento, iniciar_execucao, secao
+from renda import ROTULOS_RENDA
 
 # Caminho da logo
 logo_path = os.path.join(os.path.dirname(__file__), 'img', 'logo.png')
@@ -99,56 +108,126 @@ def inject_animation_css():
         </style>
     """, unsafe_allow_html=True)
 
-# Função para carregar os dados com cache (alunos)
-@st.cache_data
-def load_data():
-    return pd.read_excel('alunos_pii_none.xlsx')
-
-# Função para carregar os dados de desistência com cache
-@st.cache_data
-def load_desistencia_data():
-    return pd.read_excel('desistencia.xlsx')
-
-@st.cache_data
-def carregar_dados():
-    df = pd.read_excel("perfil_alunos_desistentes_limpo.xlsx")
-    # Converter a coluna de datas para datetime, se ainda não estiver
-    df['data_de_desistência_do_curso'] = pd.to_datetime(df['data_de_desistência_do_curso'], errors='coerce')
-    return df
-
-df = carregar_dados()
-
-@st.cache_data
-def load_desistencia2_data():
-    return pd.read_excel('perfil_alunos_desistentes_limpo.xlsx')
-
-df = load_desistencia2_data()
-
-# Padroniza nomes colunas
-df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
+ARQUIVO_PERFIL = 'perfil_alunos_desistentes_limpo.xlsx'
+ARQUIVO_DESISTENCIA = 'desistencia.xlsx'
+# Base de alunos (sem dados pessoais) pontuada pelo modelo de risco; pode não estar presente
+ARQUIVO_ALUNOS = 'alunos_pii_none.xlsx'
+
+# Risco a partir do qual o aluno conta como "risco alto" e alunos mostrados no ranking
+LIMIAR_RISCO_ALTO = 0.5
+QUANTIDADE_RANKING = 50
+
+# Meses com até esta quantidade de desistências ficam fora dos gráficos por período
+QUANTIDADE_MINIMA_GRAFICO = 25
+
+# Conjuntos de dados que as páginas podem pedir. Todos mantêm todos os estágios
+# (as páginas contam todos os alunos das planilhas). As páginas só usam agregados,
+# e cada um declara as colunas que lê da planilha (COLUNAS_CUBO, COLUNAS_INDICE etc.).
+CONJUNTOS = {
+    # Contagens agregadas usadas pelos gráficos (ver cubo.py); já leem só as colunas das dimensões
+    'cubo_perfil': lambda: cubo_desistencias(ARQUIVO_PERFIL, apenas_desistencias=False),
+    'cubo_desistencia': lambda: cubo_desistencias(ARQUIVO_DESISTENCIA, apenas_desistencias=False),
+    # Contagem por dia, limitada a JANELA_MENSAL
+    'diario_perfil': lambda: contagem_diaria(
+        ARQUIVO_PERFIL, apenas_desistencias=False, meses=JANELA_MENSAL
+    ),
+    # Séries mensais e semanais com os picos já marcados (ver picos.py); as do gráfico
+    # por período e da linha do tempo também ficam limitadas a JANELA_MENSAL
+    'picos_perfil': lambda: picos_mensais(ARQUIVO_PERFIL, apenas_desistencias=False),
+    'picos_periodo': lambda: {
+        dimensao: picos_mensais(
+            ARQUIVO_PERFIL, apenas_desistencias=False, dimensao=dimensao,
+            sem_nulos=['motivo_da_desistência'], meses=JANELA_MENSAL
+        )
+        for dimensao in DIMENSOES_PICOS
+    },
+    'picos_semanais': lambda: picos_semanais(
+        ARQUIVO_PERFIL, apenas_desistencias=False, meses=JANELA_MENSAL
+    ),
+    # Previsões do total mensal e de cada motivo × estado, ajustadas uma vez por versão (ver previsao.py)
+    'previsao_desistencia': lambda: previsoes(ARQUIVO_DESISTENCIA),
+    # Datas ordenadas com somas acumuladas, para os indicadores por janela (ver indice_temporal.py)
+    'indice_perfil': lambda: indice_desistencias(ARQUIVO_PERFIL, apenas_desistencias=False),
+    # Classes do histórico com o modelo de risco treinado nelas, e alunos ativos já pontuados
+    # e ordenados (ver risco.py)
+    'modelo_risco': lambda: modelo_risco(ARQUIVO_PERFIL),
+    'risco_alunos': lambda: riscos_alunos(ARQUIVO_ALUNOS, ARQUIVO_PERFIL),
+}
 
-# --- Faixa de Renda personalizada ---
-def categorizar_renda(valor):
-    try:
-        if pd.isna(valor):
-            return "Não informado"
-        valor = str(valor).replace("R$", "").replace(".", "").replace(",", "").strip()
-        valor = int(valor)
-        if valor <= 1000:
-            return "Até R$1.000"
-        elif valor <= 2000:
-            return "R$1.001 - R$2.000"
-        elif valor <= 4000:
-            return "R$2.001 - R$4.000"
-        else:
-            return "Acima de R$4.000"
-    except:
-        return "Não informado"
-
-df["faixa_renda_familiar"] = df["renda_familiar_mensal_aproximada"].apply(categorizar_renda)
-
-# --- Estágio ---
-df['estágio'] = df['estágio'].fillna('Não informado').astype(str)
+# Indicadores da página inicial. "dias": janela até hoje (None: todo o período), com a
+# variação em relação à janela anterior de mesmo tamanho; "medida": média dessa coluna
+# em vez da contagem; "filtro": (dimensão, valor) do índice, ex.: ('estado', 'São Paulo')
+KPIS_INTRO = [
+    {"rotulo": "Total de Desistentes"},
+    {"rotulo": "Desistentes Últimos 6 Meses", "dias": 180},
+    {"rotulo": "Média de Idade", "medida": "idade", "formato": "{:.1f} anos"},
+]
+
+def valor_indicador(indice, kpi):
+    """Valor e variação (None sem janela) de um indicador de KPIS_INTRO."""
+    if kpi.get("filtro"):
+        indice = indice.fatia(*kpi["filtro"])
+    medida = kpi.get("medida")
+    if kpi.get("dias"):
+        return comparar_janelas(indice, kpi["dias"], medida=medida)
+    return (indice.contagem() if medida is None else indice.media(medida)), None
+
+def faixa_indicadores(indice, kpis, colunas):
+    # Cada indicador custa duas buscas binárias no índice, qualquer que seja a janela
+    for coluna, kpi in zip(colunas, kpis):
+        valor, variacao = valor_indicador(indice, kpi)
+        if valor is None:
+            coluna.empty()
+            continue
+        formato = kpi.get("formato", "{:.0f}")
+        delta = None if variacao is None else formato.format(variacao)
+        coluna.metric(kpi["rotulo"], formato.format(valor), delta=delta)
+
+class DadosPagina:
+    """Dá acesso aos conjuntos declarados pela página, carregando cada um só no primeiro uso."""
+
+    def __init__(self, conjuntos):
+        self.conjuntos = list(conjuntos)
+        self._carregados = {}
+        # Versão publicada das planilhas (ver atualizacao.py); entra na chave do cache de gráficos
+        self.versao = (versao_servida(ARQUIVO_PERFIL), versao_servida(ARQUIVO_DESISTENCIA))
+
+    def __getitem__(self, nome):
+        if nome not in self.conjuntos:
+            raise KeyError(f"A página não declarou o conjunto de dados '{nome}'.")
+        if nome not in self._carregados:
+            with secao(f'carga: {nome}', 'carga'):
+                self._carregados[nome] = CONJUNTOS[nome]()
+        return self._carregados[nome]
+
+# Expanders com gráficos: o conteúdo só é calculado quando o expander é aberto.
+# Como fragmento, abrir ou fechar reexecuta apenas este trecho, não a página inteira
+# (no modo diagnóstico, essa reexecução é medida e mostrada abaixo do expander).
+@st.fragment
+def grafico_sob_demanda(rotulo, chave, desenhar):
+    with fragmento(chave):
+        expander = st.expander(rotulo, expanded=False, key=chave, on_change="rerun")
+        with expander:
+            if expander.open:
+                desenhar()
+
+# No modo diagnóstico: datas preenchidas nas planilhas que não puderam ser lidas (ficaram
+# vazias nos gráficos), contadas na conversão da planilha (ver cache_colunar.relatorio_datas)
+def mostrar_datas_invalidas():
+    if not ativo():
+        return
+    with st.sidebar.expander("Datas não lidas nas planilhas"):
+        for caminho in (ARQUIVO_PERFIL, ARQUIVO_DESISTENCIA, ARQUIVO_ALUNOS):
+            if not os.path.exists(caminho):
+                continue
+            invalidas = relatorio_datas(caminho)
+            if invalidas is None:
+                st.caption(f"{caminho}: contagem indisponível (cópia colunar antiga)")
+            elif not invalidas:
+                st.caption(f"{caminho}: todas as datas lidas")
+            else:
+                for coluna, quantidade in invalidas.items():
+                    st.warning(f"{caminho}: {quantidade} data(s) inválida(s) em {coluna}")
 
 # Agrupar categorias semelhantes
 def group_similar_categories(df):
@@ -163,102 +242,94 @@ def group_similar_categories(df):
         df['Escolaridade'] = df['Escolaridade'].replace(categories, new_category)
     return df
 
-def intro():
+def intro(dados):
+    cubo = dados['cubo_perfil']
+
     st.markdown('<h1 class="custom-title fade-in fade-in-delay-1">Análise dos dados da Escola da Nuvem</h1>', unsafe_allow_html=True)
     st.markdown('<p class="fade-in fade-in-delay-2">Bem-vindo ao nosso sistema dedicado à análise detalhada dos dados de desistência da Escola da Nuvem. Nesta plataforma, você terá acesso a informações valiosas sobre os diversos aspectos das bases de dados da instutição. Nosso principal objetivo é oferecer uma visão clara e profunda das estatísticas e insights que podem ajudar a melhorar as práticas educacionais e direcionar decisões estratégicas para o futuro. Prepare-se para explorar, compreender e interagir com os dados de forma dinâmica e envolvente!</p>', unsafe_allow_html=True)
 
-    # Dados preparados (igual ao seu código)
-    desistencias_por_estado = df.groupby('estado').size().reset_index(name='contagem')
-    contagem_faixa_etaria = df['faixa_etária'].value_counts().reset_index()
-    contagem_faixa_etaria.columns = ['faixa_etária', 'quantidade']
-    contagem_origem_sexo = df.groupby(['origem', 'sexo']).size().reset_index(name='quantidade')
-    contagem_motivo = df['motivo_da_desistência'].value_counts().reset_index()
-    contagem_motivo.columns = ['motivo_da_desistência', 'quantidade']
+    # Dados preparados a partir do cubo de contagens
+    desistencias_por_estado = fatiar(cubo, ['estado']).rename(columns={'quantidade': 'contagem'})
+    contagem_faixa_etaria = contagem_ordenada(cubo, 'faixa_etária')
+    contagem_origem_sexo = fatiar(cubo, ['origem', 'sexo'])
+    contagem_motivo = contagem_ordenada(cubo, 'motivo_da_desistência')
     contagem_motivo['fração'] = contagem_motivo['quantidade'] / contagem_motivo['quantidade'].sum()
 
-    df['data_de_desistência_do_curso'] = pd.to_datetime(df['data_de_desistência_do_curso'], errors='coerce')
-    df['ano'] = df['data_de_desistência_do_curso'].dt.year
-    df['mes'] = df['data_de_desistência_do_curso'].dt.month
-    grouped = df.groupby(['ano', 'mes']).size().reset_index(name='quantidade')
-    monthly_dismissals = grouped[grouped['quantidade'] > 25]
-    monthly_dismissals['data'] = pd.to_datetime(monthly_dismissals.rename(columns={'ano':'year','mes':'month'})[['year','month']].assign(day=1))
-    monthly_dismissals['mes_ano'] = monthly_dismissals['data'].dt.strftime('%b/%Y')
-
-    # Métricas numéricas
-    total_desistentes = len(df)
-    media_idade = df['idade'].dropna().mean() if 'idade' in df.columns else None
-    seis_meses_atras = datetime.now() - timedelta(days=180)
-    desistentes_6meses = df[df['data_de_desistência_do_curso'] >= seis_meses_atras].shape[0]
+    # Série mensal já agregada (picos.py), sem reagrupar o cubo a cada execução
+    grouped = dados['picos_perfil'].tabela()[['ano_mes', 'quantidade']]
+    monthly_dismissals = grouped[grouped['quantidade'] > QUANTIDADE_MINIMA_GRAFICO].reset_index(drop=True)
+    monthly_dismissals['data'] = rotular(monthly_dismissals['ano_mes'], 'inicio')
+    monthly_dismissals['mes_ano'] = rotular(monthly_dismissals['ano_mes'], 'rotulo_curto')
+    monthly_dismissals = monthly_dismissals.drop(columns='ano_mes')
 
     # Gráficos
-    chart1 = alt.Chart(desistencias_por_estado).mark_bar(color='#1c83e1').encode(
-        x=alt.X('contagem:Q', title='Desistências'),
-        y=alt.Y('estado:N', sort='-x', title='Estado'),
-        tooltip=['estado', 'contagem']
-    ).properties(width=350, height=250, title='Desistências por Estado')
-
-    chart2 = alt.Chart(contagem_faixa_etaria).mark_bar().encode(
-    x=alt.X('faixa_etária:N', sort='-y', title='Faixa Etária', axis=alt.Axis(labelAngle=-40)),
-    y=alt.Y('quantidade:Q', title='Quantidade'),
-    color=alt.Color('quantidade:Q', scale=alt.Scale(scheme='blues'), legend=None),  # aqui
-    tooltip=['faixa_etária', 'quantidade']
-    ).properties(width=400, height=250, title='Faixa Etária dos Desistentes').configure_title(
-        fontSize=14, anchor='start', offset=10
-    )
-
-    chart3 = alt.Chart(contagem_origem_sexo).mark_bar().encode(
-        x=alt.X('origem:N', title='Origem', axis=alt.Axis(labelAngle=-40)),
+    def chart1():
+        return alt.Chart(desistencias_por_estado).mark_bar(color='#1c83e1').encode(
+            x=alt.X('contagem:Q', title='Desistências'),
+            y=alt.Y('estado:N', sort='-x', title='Estado'),
+            tooltip=['estado', 'contagem']
+        ).properties(width=350, height=250, title='Desistências por Estado')
+
+    def chart2():
+        return alt.Chart(contagem_faixa_etaria).mark_bar().encode(
+        x=alt.X('faixa_etária:N', sort='-y', title='Faixa Etária', axis=alt.Axis(labelAngle=-40)),
         y=alt.Y('quantidade:Q', title='Quantidade'),
-        color=alt.Color('sexo:N', title='Sexo'),
-        tooltip=['origem', 'sexo', 'quantidade']
-    ).properties(width=400, height=250, title='Origem dos Alunos Desistentes').configure_title(
-        fontSize=14, anchor='start', offset=10
-    )
+        color=alt.Color('quantidade:Q', scale=alt.Scale(scheme='blues'), legend=None),  # aqui
+        tooltip=['faixa_etária', 'quantidade']
+        ).properties(width=400, height=250, title='Faixa Etária dos Desistentes').configure_title(
+            fontSize=14, anchor='start', offset=10
+        )
 
-    chart4 = alt.Chart(contagem_motivo).mark_arc(innerRadius=50).encode(
-        theta=alt.Theta(field='fração', type='quantitative'),
-        color=alt.Color(field='motivo_da_desistência', type='nominal', legend=alt.Legend(title="Motivo da Desistência")),
-        tooltip=['motivo_da_desistência', 'quantidade', alt.Tooltip('fração', format='.2%')]
-    ).properties(width=350, height=300, title='Motivos de Desistência')
+    def chart3():
+        return alt.Chart(contagem_origem_sexo).mark_bar().encode(
+            x=alt.X('origem:N', title='Origem', axis=alt.Axis(labelAngle=-40)),
+            y=alt.Y('quantidade:Q', title='Quantidade'),
+            color=alt.Color('sexo:N', title='Sexo'),
+            tooltip=['origem', 'sexo', 'quantidade']
+        ).properties(width=400, height=250, title='Origem dos Alunos Desistentes').configure_title(
+            fontSize=14, anchor='start', offset=10
+        )
 
-    chart5 = alt.Chart(monthly_dismissals).mark_line(point=True).encode(
-        x=alt.X('mes_ano:N', title='Mês/Ano', sort=None),
-        y=alt.Y('quantidade:Q', title='Quantidade'),
-        tooltip=['mes_ano', 'quantidade']
-    ).properties(width=720, height=250, title='Desistências por Período').configure_axis(labelAngle=-45)
+    def chart4():
+        return alt.Chart(contagem_motivo).mark_arc(innerRadius=50).encode(
+            theta=alt.Theta(field='fração', type='quantitative'),
+            color=alt.Color(field='motivo_da_desistência', type='nominal', legend=alt.Legend(title="Motivo da Desistência")),
+            tooltip=['motivo_da_desistência', 'quantidade', alt.Tooltip('fração', format='.2%')]
+        ).properties(width=350, height=300, title='Motivos de Desistência')
+
+    def chart5():
+        return alt.Chart(monthly_dismissals).mark_line(point=True).encode(
+            x=alt.X('mes_ano:N', title='Mês/Ano', sort=None),
+            y=alt.Y('quantidade:Q', title='Quantidade'),
+            tooltip=['mes_ano', 'quantidade']
+        ).properties(width=720, height=250, title='Desistências por Período').configure_axis(labelAngle=-45)
 
     # Layout gráficos principais em colunas (chart1, chart2, chart3)
     col1, col2, col3 = st.columns(3)
     with col1:
-        st.altair_chart(chart1, use_container_width=True)
+        exibir_grafico('intro_estado', dados.versao, chart1)
     with col2:
-        st.altair_chart(chart2, use_container_width=True)
+        exibir_grafico('intro_faixa_etaria', dados.versao, chart2)
     with col3:
-        st.altair_chart(chart3, use_container_width=True)
+        exibir_grafico('intro_origem_sexo', dados.versao, chart3)
 
     col_motivo, spacer, col_metrics = st.columns([1, 0.1, 1])
 
     with col_motivo:
-        st.altair_chart(chart4, use_container_width=True)
+        exibir_grafico('intro_motivos', dados.versao, chart4)
 
     with spacer:
         st.write("")  # Coluna só para espaçamento vazio
 
     with col_metrics:
-        col1, col2, col3 = st.columns(3)
-
-        col1.metric("Total de Desistentes", f"{total_desistentes}")
-        col2.metric("Desistentes Últimos 6 Meses", f"{desistentes_6meses}")
-        
-        if media_idade is not None:
-            col3.metric("Média de Idade", f"{media_idade:.1f} anos")
-        else:
-            col3.empty()
+        faixa_indicadores(dados['indice_perfil'], KPIS_INTRO, st.columns(len(KPIS_INTRO)))
 
     # Gráfico maior
-    st.altair_chart(chart5, use_container_width=True)
+    exibir_grafico('intro_periodo', dados.versao, chart5)
+
+def desistencias(dados):
+    cubo = dados['cubo_perfil']
 
-def desistencias():
     inject_animation_css()
 
     st.markdown('<h1 class="custom-title fade-in fade-in-delay-1">Dados Escola da Nuvem - Desistências</h1>', unsafe_allow_html=True)
@@ -269,32 +340,42 @@ def desistencias():
         para apoiar a retenção dos estudantes e melhorar a eficácia dos programas educacionais da iniciativa.
     </p>''', unsafe_allow_html=True)
 
-    with st.spinner("Carregando dados..."):
-        time.sleep(2)
+    # Indicadores rápidos primeiro (saem do cubo já em cache); os gráficos
+    # aparecem em seguida, cada um assim que seus dados ficam prontos
+    contagem_estados = contagem_ordenada(cubo, 'estado')
+    contagem_motivos = contagem_ordenada(cubo, 'motivo_da_desistência')
 
-    df_desistencia = load_desistencia_data()
-    df_desistencia = df_desistencia[df_desistencia['motivo_da_desistência'].notna()]
+    kpi1, kpi2, kpi3 = st.columns(3)
+    kpi1.metric("Total de Desistências", f"{int(cubo['quantidade'].sum())}")
+    kpi2.metric("Estado com mais desistências", contagem_estados['estado'].iloc[0] if len(contagem_estados) else "—")
+    kpi3.metric("Motivo mais frequente", contagem_motivos['motivo_da_desistência'].iloc[0] if len(contagem_motivos) else "—")
 
-    desistencias_por_estado = df_desistencia.groupby('estado').size().reset_index(name='contagem')
+    with st.spinner("Carregando dados de desistência..."):
+        cubo_desistencia = dados['cubo_desistencia']
+
+        desistencias_por_estado = fatiar(
+            cubo_desistencia, ['estado'], sem_nulos=['motivo_da_desistência']
+        ).rename(columns={'quantidade': 'contagem'})
     desistencias_por_estado = desistencias_por_estado.sort_values(by='contagem', ascending=False).head(10)
 
     #--------------- GRÁFICO 1 ---------------#
 
     # Gráfico (full width)
-    chart = alt.Chart(desistencias_por_estado).mark_bar(color='#1c83e1').encode(
-        x=alt.X('contagem:Q', title='Número de desistências'),
-        y=alt.Y('estado:N', sort='-x', title='Estado'),
-        tooltip=[alt.Tooltip('estado:N', title='Estado'),
-                alt.Tooltip('contagem:Q', title='Número de Desistências')]
-    ).properties(
-        width=800,
-        height=400,
-        title='Gráfico dos estados com mais desistências'
-    ).configure_title(
-        fontSize=24,  # tamanho maior do título
-        fontWeight='bold',
-        anchor='start',  # alinhamento do título
-    )
+    def chart():
+        return alt.Chart(desistencias_por_estado).mark_bar(color='#1c83e1').encode(
+            x=alt.X('contagem:Q', title='Número de desistências'),
+            y=alt.Y('estado:N', sort='-x', title='Estado'),
+            tooltip=[alt.Tooltip('estado:N', title='Estado'),
+                    alt.Tooltip('contagem:Q', title='Número de Desistências')]
+        ).properties(
+            width=800,
+            height=400,
+            title='Gráfico dos estados com mais desistências'
+        ).configure_title(
+            fontSize=24,  # tamanho maior do título
+            fontWeight='bold',
+            anchor='start',  # alinhamento do título
+        )
 
     # Envolvendo o gráfico numa div com margem-top para espaçamento
     st.markdown(
@@ -304,7 +385,7 @@ def desistencias():
         unsafe_allow_html=True
     )
 
-    st.altair_chart(chart, use_container_width=True)
+    exibir_grafico('estados', dados.versao, chart)
 
     st.markdown(
         """
@@ -339,7 +420,7 @@ def desistencias():
 
             Também é recomendável realizar análises periódicas desses dados e implementar pesquisas de satisfação e motivos de desistência para aprimorar continuamente a experiência dos alunos.
             """)
-        with st.expander("📈Gráfico da distribuição percentual das desistências por estado", expanded=False):
+        def grafico_estados_percentual():
             desistencias_por_estado['percentual'] = (desistencias_por_estado['contagem'] / desistencias_por_estado['contagem'].sum()) * 100
 
             # Container com altura fixa e scroll vertical
@@ -347,51 +428,53 @@ def desistencias():
             <div style="max-height: 300px; overflow-y: auto;">
             """, unsafe_allow_html=True)
 
-            pie_chart = alt.Chart(desistencias_por_estado).mark_arc(innerRadius=50).encode(
-            theta=alt.Theta(field="contagem", type="quantitative"),
-            color=alt.Color(field="estado", type="nominal", legend=alt.Legend(title="Legenda")),
-            tooltip=[alt.Tooltip("estado:N", title="Estado"), alt.Tooltip("percentual:Q", format=".2f", title="Percentual (%)")]
-        ).properties(
-            width=350,
-            height=195,
-        ).configure_title(
-            fontSize=14,
-            anchor="start"
-        ).configure_legend(
-            labelFontSize=12  # diminui o tamanho da fonte da legenda
-        )
+            def pie_chart():
+                return alt.Chart(desistencias_por_estado).mark_arc(innerRadius=50).encode(
+                theta=alt.Theta(field="contagem", type="quantitative"),
+                color=alt.Color(field="estado", type="nominal", legend=alt.Legend(title="Legenda")),
+                tooltip=[alt.Tooltip("estado:N", title="Estado"), alt.Tooltip("percentual:Q", format=".2f", title="Percentual (%)")]
+            ).properties(
+                width=350,
+                height=195,
+            ).configure_title(
+                fontSize=14,
+                anchor="start"
+            ).configure_legend(
+                labelFontSize=12  # diminui o tamanho da fonte da legenda
+            )
 
-            st.altair_chart(pie_chart)
+            exibir_grafico('estados_percentual', dados.versao, pie_chart, use_container_width=False)
 
             st.markdown("</div>", unsafe_allow_html=True)
+        grafico_sob_demanda("📈Gráfico da distribuição percentual das desistências por estado", "exp_estados_percentual", grafico_estados_percentual)
 
     #--------------- GRÁFICO 2 ---------------#
 
     # Preparar os dados
-    contagem_faixa_etaria = df['faixa_etária'].value_counts().reset_index()
-    contagem_faixa_etaria.columns = ['faixa_etária', 'quantidade']
+    contagem_faixa_etaria = contagem_ordenada(cubo, 'faixa_etária')
 
     # Criar o gráfico Altair com gradiente nas barras
-    chart = alt.Chart(contagem_faixa_etaria).mark_bar().encode(
-        x=alt.X('faixa_etária:N', sort='-y', title='Faixa etária'),
-        y=alt.Y('quantidade:Q', title='Quantidade'),
-        color=alt.Color('quantidade:Q', scale=alt.Scale(scheme='blues'), legend=alt.Legend(title='Quantidade')),
-        tooltip=[
-            alt.Tooltip('faixa_etária:N', title='Faixa etária'),
-            alt.Tooltip('quantidade:Q', title='Quantidade')
-        ]
-    ).properties(
-        width=700,
-        height=400,
-        title='Gráfico da faixa etária dos desistentes'
-    ).configure_title(
-        fontSize=24,
-        fontWeight='bold',
-        anchor='start'
-    ).configure_axis(
-        labelFontSize=14,
-        titleFontSize=16
-    )
+    def chart():
+        return alt.Chart(contagem_faixa_etaria).mark_bar().encode(
+            x=alt.X('faixa_etária:N', sort='-y', title='Faixa etária'),
+            y=alt.Y('quantidade:Q', title='Quantidade'),
+            color=alt.Color('quantidade:Q', scale=alt.Scale(scheme='blues'), legend=alt.Legend(title='Quantidade')),
+            tooltip=[
+                alt.Tooltip('faixa_etária:N', title='Faixa etária'),
+                alt.Tooltip('quantidade:Q', title='Quantidade')
+            ]
+        ).properties(
+            width=700,
+            height=400,
+            title='Gráfico da faixa etária dos desistentes'
+        ).configure_title(
+            fontSize=24,
+            fontWeight='bold',
+            anchor='start'
+        ).configure_axis(
+            labelFontSize=14,
+            titleFontSize=16
+        )
 
     # Espaço com margin-top para o gráfico
     st.markdown(
@@ -402,7 +485,7 @@ def desistencias():
     )
 
     # Renderizar gráfico
-    st.altair_chart(chart, use_container_width=True)
+    exibir_grafico('faixa_etaria', dados.versao, chart)
 
     # Fechar div
     st.markdown("</div>", unsafe_allow_html=True)
@@ -454,7 +537,7 @@ def desistencias():
         ]
 
         # Container com altura fixa e scroll vertical
-        with st.expander("📈 Gráfico de desistências com média de desistências por faixa etária", expanded=False):
+        def grafico_faixa_etaria_media():
             st.markdown("""
                 <div style="max-height: 400px; overflow-y: auto;">
             """, unsafe_allow_html=True)
@@ -462,80 +545,82 @@ def desistencias():
             # Cálculo da média
             media_desistencias = df_faixa_etaria['quantidade'].mean()
 
-            # Gráfico de barras
-            barras = alt.Chart(df_faixa_etaria).mark_bar(color='#1c83e1').encode(
-                x=alt.X('faixa_etária:N', sort=ordem_faixa_etaria, title='Faixa Etária'),
-                y=alt.Y('quantidade:Q', title='Quantidade de Desistentes'),
-                tooltip=[
-                    alt.Tooltip('faixa_etária:N', title='Faixa Etária'),
-                    alt.Tooltip('quantidade:Q', title='Quantidade')
-                ]
-            )
-
-            # Linha da média
-            linha_media = alt.Chart(pd.DataFrame({
-                'media': [media_desistencias]
-            })).mark_rule(color='red', strokeDash=[5,5]).encode(
-                y='media:Q'
-            ).properties(
-                title='Gráfico de desistências com linha de média'
-            )
-
-            # Combinação dos dois gráficos
-            grafico = (barras + linha_media).properties(
-                width=700,
-                height=400
-            ).configure_title(
-                fontSize=18,
-                fontWeight='bold',
-                anchor='start'
-            ).configure_axis(
-                labelFontSize=12,
-                titleFontSize=14
-            )
+            def grafico():
+                # Gráfico de barras
+                barras = alt.Chart(df_faixa_etaria).mark_bar(color='#1c83e1').encode(
+                    x=alt.X('faixa_etária:N', sort=ordem_faixa_etaria, title='Faixa Etária'),
+                    y=alt.Y('quantidade:Q', title='Quantidade de Desistentes'),
+                    tooltip=[
+                        alt.Tooltip('faixa_etária:N', title='Faixa Etária'),
+                        alt.Tooltip('quantidade:Q', title='Quantidade')
+                    ]
+                )
+
+                # Linha da média
+                linha_media = alt.Chart(pd.DataFrame({
+                    'media': [media_desistencias]
+                })).mark_rule(color='red', strokeDash=[5,5]).encode(
+                    y='media:Q'
+                ).properties(
+                    title='Gráfico de desistências com linha de média'
+                )
+
+                # Combinação dos dois gráficos
+                return (barras + linha_media).properties(
+                    width=700,
+                    height=400
+                ).configure_title(
+                    fontSize=18,
+                    fontWeight='bold',
+                    anchor='start'
+                ).configure_axis(
+                    labelFontSize=12,
+                    titleFontSize=14
+                )
 
             # Renderizar gráfico
-            st.altair_chart(grafico, use_container_width=True)
+            exibir_grafico('faixa_etaria_media', dados.versao, grafico)
 
             st.markdown("</div>", unsafe_allow_html=True)
+        grafico_sob_demanda("📈 Gráfico de desistências com média de desistências por faixa etária", "exp_faixa_etaria_media", grafico_faixa_etaria_media)
 
     #--------------- GRÁFICO 3 ---------------#
 
     # Exemplo de agrupamento para stacked bar
-    contagem_origem_sexo = df.groupby(['origem', 'sexo']).size().reset_index(name='quantidade')
-
-    chart_stacked_bar = alt.Chart(contagem_origem_sexo).mark_bar().encode(
-        x=alt.X('origem:N', title='Origem'),
-        y=alt.Y('quantidade:Q', title='Quantidade'),
-        color=alt.Color('sexo:N', title='Sexo'),
-        tooltip=[
-            alt.Tooltip('origem:N', title='Origem'),
-            alt.Tooltip('sexo:N', title='Sexo'),
-            alt.Tooltip('quantidade:Q', title='Quantidade')
-        ]
-    ).properties(
-        width=700,
-        height=400,
-        title='Gráfico da origem dos alunos desistentes'
-    ).configure_title(
-        fontSize=24,
-        fontWeight='bold',
-        anchor='start'
-    ).configure_axis(
-        labelFontSize=14,
-        titleFontSize=16
-    )
+    contagem_origem_sexo = fatiar(cubo, ['origem', 'sexo'])
+
+    def chart_stacked_bar():
+        return alt.Chart(contagem_origem_sexo).mark_bar().encode(
+            x=alt.X('origem:N', title='Origem'),
+            y=alt.Y('quantidade:Q', title='Quantidade'),
+            color=alt.Color('sexo:N', title='Sexo'),
+            tooltip=[
+                alt.Tooltip('origem:N', title='Origem'),
+                alt.Tooltip('sexo:N', title='Sexo'),
+                alt.Tooltip('quantidade:Q', title='Quantidade')
+            ]
+        ).properties(
+            width=700,
+            height=400,
+            title='Gráfico da origem dos alunos desistentes'
+        ).configure_title(
+            fontSize=24,
+            fontWeight='bold',
+            anchor='start'
+        ).configure_axis(
+            labelFontSize=14,
+            titleFontSize=16
+        )
 
     st.markdown("<div style='margin-top: 25px;'>", unsafe_allow_html=True)
-    st.altair_chart(chart_stacked_bar, use_container_width=True)
+    exibir_grafico('origem_sexo', dados.versao, chart_stacked_bar)
     st.markdown("</div>", unsafe_allow_html=True)
 
     # Disposição em colunas para tabela e expanders ao lado, com títulos estilizados
     col1, col2 = st.columns([2.5, 2])
 
     # Preparar os dados para o gráfico e a tabela
-    contagem_origem = df['origem'].value_counts().reset_index()
-    contagem_origem.columns = ['origem', 'quantidade']
+    contagem_origem = contagem_ordenada(cubo, 'origem')
 
     with col1:
         st.markdown('<span style="font-size: 24px;"><b>Tabela da origem dos alunos desistentes</b></span>', unsafe_allow_html=True)
@@ -572,42 +657,58 @@ def desistencias():
             - **Potencializar parcerias e eventos online**, garantindo que a mensagem e as expectativas sejam alinhadas para reduzir desistências.
             """)
 
-        with st.expander("📈 Gráfico linha do tempo das desistências", expanded=False):
+        def grafico_linha_tempo():
             st.markdown("""<div style="max-height: 450px; overflow-y: auto;">""", unsafe_allow_html=True)
             
             # Agrupar por data e contar desistências
-            df_timeline = df.groupby('data_de_desistência_do_curso').size().reset_index(name='quantidade')
+            with st.spinner("Calculando linha do tempo..."):
+                df_timeline = dados['diario_perfil']
+                semanais = dados['picos_semanais']
             # Ordenar por data (caso não esteja ordenado)
             df_timeline = df_timeline.sort_values('data_de_desistência_do_curso')
 
+            # Dias das semanas marcadas como pico (ver picos.py)
+            semanas_pico = semanais.grade.periodos[semanais.pico[:, 0]]
+            df_timeline['semana_pico'] = df_timeline['data_de_desistência_do_curso'].dt.to_period('W').isin(semanas_pico)
+
             # Gráfico de linha Altair
-            linha_tempo = alt.Chart(df_timeline).mark_line(point=True).encode(
-                x=alt.X('data_de_desistência_do_curso:T', title='Data da Desistência', axis=alt.Axis(format='%d/%m/%Y')),
-                y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
-                tooltip=[
+            def linha_tempo():
+                dicas = [
                     alt.Tooltip('data_de_desistência_do_curso:T', title='Data', format='%d/%m/%Y'),
                     alt.Tooltip('quantidade:Q', title='Quantidade')
                 ]
-            ).properties(
-                width=700,
-                height=400,
-                title='Linha do Tempo das Desistências'
-            ).configure_title(
-                fontSize=18,
-                fontWeight='bold',
-                anchor='start'
-            ).configure_axis(
-                labelFontSize=12,
-                titleFontSize=14
-            )
-
-            st.altair_chart(linha_tempo, use_container_width=True)
+                linha = alt.Chart(df_timeline).mark_line(point=True).encode(
+                    x=alt.X('data_de_desistência_do_curso:T', title='Data da Desistência', axis=alt.Axis(format='%d/%m/%Y')),
+                    y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
+                    tooltip=dicas
+                )
+                destaques = alt.Chart(df_timeline).transform_filter(alt.datum.semana_pico).mark_point(
+                    filled=True, color='#d62728'
+                ).encode(
+                    x='data_de_desistência_do_curso:T',
+                    y='quantidade:Q',
+                    tooltip=dicas
+                )
+                return (linha + destaques).properties(
+                    width=700,
+                    height=400,
+                    title='Linha do Tempo das Desistências'
+                ).configure_title(
+                    fontSize=18,
+                    fontWeight='bold',
+                    anchor='start'
+                ).configure_axis(
+                    labelFontSize=12,
+                    titleFontSize=14
+                )
+
+            exibir_grafico('linha_tempo', dados.versao, linha_tempo)
             st.markdown("</div>", unsafe_allow_html=True)
+        grafico_sob_demanda("📈 Gráfico linha do tempo das desistências", "exp_linha_tempo", grafico_linha_tempo)
 
     #--------------- GRÁFICO 4 ---------------#
     
-    contagem_motivo = df['motivo_da_desistência'].value_counts().reset_index()
-    contagem_motivo.columns = ['motivo_da_desistência', 'quantidade']
+    contagem_motivo = contagem_ordenada(cubo, 'motivo_da_desistência')
 
     # Calcular a fração para cada motivo
     contagem_motivo['fração'] = contagem_motivo['quantidade'] / contagem_motivo['quantidade'].sum()
@@ -617,23 +718,24 @@ def desistencias():
     contagem_motivo['ângulo_final'] = contagem_motivo['fração'].cumsum()
 
     # Criar gráfico de pizza com marca arc
-    pizza = alt.Chart(contagem_motivo).mark_arc(innerRadius=50).encode(
-        theta=alt.Theta(field='fração', type='quantitative'),
-        color=alt.Color(field='motivo_da_desistência', type='nominal', legend=alt.Legend(title="Motivo da Desistência")),
-        tooltip=[
-            alt.Tooltip('motivo_da_desistência:N', title='Motivo'),
-            alt.Tooltip('quantidade:Q', title='Quantidade'),
-            alt.Tooltip('fração:Q', title='Percentual', format='.2%')
-        ]
-    ).properties(
-        width=400,
-        height=400,
-        title='Gráfico dos motivos de desistência'
-    ).configure_title(
-        fontSize=24,
-        fontWeight='bold',
-        anchor='start'
-    )
+    def pizza():
+        return alt.Chart(contagem_motivo).mark_arc(innerRadius=50).encode(
+            theta=alt.Theta(field='fração', type='quantitative'),
+            color=alt.Color(field='motivo_da_desistência', type='nominal', legend=alt.Legend(title="Motivo da Desistência")),
+            tooltip=[
+                alt.Tooltip('motivo_da_desistência:N', title='Motivo'),
+                alt.Tooltip('quantidade:Q', title='Quantidade'),
+                alt.Tooltip('fração:Q', title='Percentual', format='.2%')
+            ]
+        ).properties(
+            width=400,
+            height=400,
+            title='Gráfico dos motivos de desistência'
+        ).configure_title(
+            fontSize=24,
+            fontWeight='bold',
+            anchor='start'
+        )
 
     # Espaço com margin-top para o gráfico
     st.markdown(
@@ -643,14 +745,13 @@ def desistencias():
         unsafe_allow_html=True
     )
 
-    st.altair_chart(pizza, use_container_width=True)
+    exibir_grafico('motivos', dados.versao, pizza)
 
     # Disposição em colunas para tabela e expanders ao lado, com títulos estilizados
     col1, col2 = st.columns([2.5, 2])
 
     # Preparar os dados para o gráfico e a tabela
-    contagem_motivo = df['motivo_da_desistência'].value_counts().reset_index()
-    contagem_motivo.columns = ['motivo_da_desistência', 'quantidade']
+    contagem_motivo = contagem_ordenada(cubo, 'motivo_da_desistência')
 
     with col1:
         st.markdown('<span style="font-size: 24px;"><b>Tabela dos Motivos de Desistência</b></span>', unsafe_allow_html=True)
@@ -686,19 +787,16 @@ def desistencias():
             - **Potencializar parcerias e eventos online**, garantindo que a mensagem e as expectativas sejam alinhadas para reduzir desistências.
             """)
 
-        with st.expander("📈 Gráfico das desistências por motivo e faixa de renda", expanded=False):
+        def grafico_motivo_renda():
             st.markdown("""<div style="max-height: 450px; overflow-y: auto;">""", unsafe_allow_html=True)
 
             # Filtrar faixas de renda específicas
-            faixas_renda_desejadas = ['Até R$1.000', 'R$1.001 - R$2.000', 'R$2.001 - R$4.000', 'Acima de R$4.000']
-            df_filtered = df[df['faixa_renda_familiar'].isin(faixas_renda_desejadas)]
+            faixas_renda_desejadas = ROTULOS_RENDA
 
             # Agrupar por motivo e faixa de renda, contar desistências
-            heatmap_data = (
-                df_filtered
-                .groupby(['motivo_da_desistência', 'faixa_renda_familiar'])
-                .size()
-                .reset_index(name='quantidade')
+            heatmap_data = fatiar(
+                cubo, ['motivo_da_desistência', 'faixa_renda_familiar'],
+                filtros={'faixa_renda_familiar': faixas_renda_desejadas}
             )
 
             # Pivotar para matriz
@@ -708,80 +806,91 @@ def desistencias():
             heatmap_long = heatmap_pivot.reset_index().melt(id_vars='faixa_renda_familiar', var_name='Motivo da Desistência', value_name='Quantidade')
 
             # Gráfico heatmap Altair
-            heatmap_chart = alt.Chart(heatmap_long).mark_rect().encode(
-                x=alt.X('Motivo da Desistência:N', title=None, axis=alt.Axis(labels=False, ticks=False)),  # Remove rótulos e ticks do eixo X
-                y=alt.Y('faixa_renda_familiar:N', title=None, axis=alt.Axis(labels=False, ticks=False)),  # Remove rótulos e ticks do eixo Y
-                color=alt.Color('Quantidade:Q', scale=alt.Scale(scheme='blues'), title='Quantidade de Desistências'),
-                tooltip=[
-                    alt.Tooltip('faixa_renda_familiar:N', title='Faixa de Renda Familiar'),
-                    alt.Tooltip('Motivo da Desistência:N', title='Motivo'),
-                    alt.Tooltip('Quantidade:Q', title='Quantidade')
-                ]
-            ).properties(
-                width=700,
-                height=300,
-                title='Heatmap das Desistências por Motivo e Faixa de Renda'
-            ).configure_title(
-                fontSize=18,
-                fontWeight='bold',
-                anchor='start'
-            )
-
-            st.altair_chart(heatmap_chart, use_container_width=True)
+            def heatmap_chart():
+                return alt.Chart(heatmap_long).mark_rect().encode(
+                    x=alt.X('Motivo da Desistência:N', title=None, axis=alt.Axis(labels=False, ticks=False)),  # Remove rótulos e ticks do eixo X
+                    y=alt.Y('faixa_renda_familiar:N', title=None, axis=alt.Axis(labels=False, ticks=False)),  # Remove rótulos e ticks do eixo Y
+                    color=alt.Color('Quantidade:Q', scale=alt.Scale(scheme='blues'), title='Quantidade de Desistências'),
+                    tooltip=[
+                        alt.Tooltip('faixa_renda_familiar:N', title='Faixa de Renda Familiar'),
+                        alt.Tooltip('Motivo da Desistência:N', title='Motivo'),
+                        alt.Tooltip('Quantidade:Q', title='Quantidade')
+                    ]
+                ).properties(
+                    width=700,
+                    height=300,
+                    title='Heatmap das Desistências por Motivo e Faixa de Renda'
+                ).configure_title(
+                    fontSize=18,
+                    fontWeight='bold',
+                    anchor='start'
+                )
+
+            exibir_grafico('heatmap_motivo_renda', dados.versao, heatmap_chart)
             st.markdown("</div>", unsafe_allow_html=True)
+        grafico_sob_demanda("📈 Gráfico das desistências por motivo e faixa de renda", "exp_motivo_renda", grafico_motivo_renda)
 
     #--------------- GRÁFICO 5 ---------------#
 
-    # Garantir que a coluna de data está no formato datetime
-    df['data_de_desistência_do_curso'] = pd.to_datetime(df['data_de_desistência_do_curso'], errors='coerce')
-    df['ano'] = df['data_de_desistência_do_curso'].dt.year
-    df['mes'] = df['data_de_desistência_do_curso'].dt.month
+    # Total por mês (apenas desistências com motivo informado), com os picos já
+    # detectados em cada série (z-score móvel e mesmo mês do ano anterior, ver picos.py)
+    picos = dados['picos_periodo']
+    monthly_dismissals = picos[None].tabela()[['ano_mes', 'quantidade', 'pico']]
 
-    # Agrupar os dados
-    grouped = df.groupby(['ano', 'mes', 'motivo_da_desistência']).size().reset_index(name='quantidade')
-    monthly_dismissals = grouped.groupby(['ano', 'mes']).agg({'quantidade': 'sum'}).reset_index()
+    # Filtrar para quantidades acima do mínimo
+    filtered_monthly_dismissals = monthly_dismissals[
+        monthly_dismissals['quantidade'] > QUANTIDADE_MINIMA_GRAFICO
+    ].reset_index(drop=True)
 
-    # Filtrar para quantidades acima de 25
-    filtered_monthly_dismissals = monthly_dismissals[monthly_dismissals['quantidade'] > 25]
+    # Data do primeiro dia do mês, usada para ordenar e marcar os picos
+    filtered_monthly_dismissals['data'] = rotular(filtered_monthly_dismissals['ano_mes'], 'inicio')
 
-    # Corrigir colunas para criar a data
-    filtered_monthly_dismissals['data'] = pd.to_datetime(
-        filtered_monthly_dismissals.rename(columns={'ano': 'year', 'mes': 'month'})[['year', 'month']].assign(day=1)
-    )
+    # Criar coluna mes/ano no formato 'Jan/2023' (calendário em pt-BR)
+    filtered_monthly_dismissals['mes_ano'] = rotular(filtered_monthly_dismissals['ano_mes'], 'rotulo_curto')
 
-    # Criar coluna mes/ano no formato 'Jan/2023'
-    filtered_monthly_dismissals['mes_ano'] = filtered_monthly_dismissals['data'].dt.strftime('%b/%Y')
+    # Motivos e estados que tiveram pico em cada mês
+    for dimensao, coluna in [('motivo_da_desistência', 'motivos_em_alta'), ('estado', 'estados_em_alta')]:
+        em_alta = picos[dimensao].em_alta().map(', '.join)
+        filtered_monthly_dismissals[coluna] = em_alta.reindex(filtered_monthly_dismissals['ano_mes']).fillna('—').to_numpy()
+    filtered_monthly_dismissals = filtered_monthly_dismissals.drop(columns='ano_mes')
 
-    # Encontrar os dois maiores picos
-    top2 = filtered_monthly_dismissals.nlargest(2, 'quantidade')
-
-    # Marcar se é um dos maiores picos
-    filtered_monthly_dismissals['is_top'] = filtered_monthly_dismissals['data'].isin(top2['data'])
-
-    # Criar gráfico de linha com Altair
-    linha = alt.Chart(filtered_monthly_dismissals).mark_line(point=True).encode(
-        x=alt.X('mes_ano:N', title='Mês/Ano', sort=None),
-        y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
-        tooltip=[
+    def grafico():
+        dicas = [
             alt.Tooltip('mes_ano:N', title='Mês/Ano'),
-            alt.Tooltip('quantidade:Q', title='Quantidade')
+            alt.Tooltip('quantidade:Q', title='Quantidade'),
+            alt.Tooltip('motivos_em_alta:N', title='Motivos em alta'),
+            alt.Tooltip('estados_em_alta:N', title='Estados em alta'),
         ]
-    ).properties(
-        width=600,
-        height=400,
-        title='Gráfico de desistências por período do ano'
-    )
+        # Criar gráfico de linha com Altair
+        linha = alt.Chart(filtered_monthly_dismissals).mark_line(point=True).encode(
+            x=alt.X('mes_ano:N', title='Mês/Ano', sort=None),
+            y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
+            tooltip=dicas
+        )
 
-    # Configurações adicionais do gráfico
-    grafico = linha.configure_axis(
-        labelAngle=-45
-    ).configure_title(
-        fontSize=24,
-        anchor='start',
-        fontWeight='bold'
-    ).configure_view(
-        strokeWidth=0
-    )
+        # Meses marcados como pico
+        destaques = alt.Chart(filtered_monthly_dismissals).transform_filter(alt.datum.pico).mark_point(
+            size=150, filled=True, color='#d62728'
+        ).encode(
+            x=alt.X('mes_ano:N', sort=None),
+            y='quantidade:Q',
+            tooltip=dicas
+        )
+
+        # Configurações adicionais do gráfico
+        return (linha + destaques).properties(
+            width=600,
+            height=400,
+            title='Gráfico de desistências por período do ano'
+        ).configure_axis(
+            labelAngle=-45
+        ).configure_title(
+            fontSize=24,
+            anchor='start',
+            fontWeight='bold'
+        ).configure_view(
+            strokeWidth=0
+        )
 
     # Espaço com margin-top para o gráfico
     st.markdown(
@@ -792,7 +901,7 @@ def desistencias():
     )
 
     # Exibir no Streamlit
-    st.altair_chart(grafico, use_container_width=True)
+    exibir_grafico('periodo', dados.versao, grafico)
 
     # Disposição em colunas para tabela e expanders ao lado, com títulos estilizados
     col1, col2 = st.columns([2.5, 2])
@@ -846,79 +955,194 @@ def desistencias():
 
             """)
 
-        with st.expander("📈 Gráfico das desistências por período do ano e motivo", expanded=False):
+        def grafico_previsao():
+            # Modelos já ajustados para a versão da planilha: aqui só se desenha
+            with st.spinner("Carregando previsões..."):
+                previsao = dados['previsao_desistencia']
+            if not len(previsao['total'].periodos):
+                st.info("Sem meses suficientes para prever.")
+                return
+
+            historico = previsao['historico'].serie()
+            df_historico = pd.DataFrame({'mes_ano': rotular(historico.index), 'quantidade': historico.to_numpy()})
+            ordem = list(df_historico['mes_ano']) + list(rotular(previsao['total'].periodos))
+
+            def grafico():
+                linha = alt.Chart(df_historico).mark_line(point=True).encode(
+                    x=alt.X('mes_ano:N', title='Mês/Ano', sort=ordem, axis=alt.Axis(labelAngle=-45)),
+                    y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
+                    tooltip=[
+                        alt.Tooltip('mes_ano:N', title='Mês/Ano'),
+                        alt.Tooltip('quantidade:Q', title='Quantidade')
+                    ]
+                )
+                return (linha + camadas_previsao(previsao['total'], ordem)).properties(
+                    width=700,
+                    height=400,
+                    title='Desistências por mês e previsão'
+                ).configure_title(
+                    fontSize=18,
+                    fontWeight='bold',
+                    anchor='start'
+                )
+
+            exibir_grafico('previsao', dados.versao, grafico)
+
+            # Motivos × estados com mais desistências previstas no próximo mês
+            proximo = previsao['series'].periodos[0]
+            series = previsao['series'].longa()
+            series = series[series['ano_mes'] == proximo].nlargest(10, 'previsao')
+            st.markdown(f"**Maiores previsões para {rotular([proximo])[0]}**")
+            st.dataframe(pd.DataFrame({
+                'Motivo': series['motivo_da_desistência'],
+                'Estado': series['estado'],
+                'Previsão': series['previsao'].round(1),
+                'Faixa provável': series['inferior'].round(0).astype(int).astype(str) + ' – '
+                                  + series['superior'].round(0).astype(int).astype(str),
+                'Modelo': series['modelo'],
+            }), hide_index=True, use_container_width=True)
+        grafico_sob_demanda("🔮 Previsão das desistências para os próximos meses", "exp_previsao", grafico_previsao)
+
+        def grafico_periodo_motivo():
             st.markdown("""<div style="max-height: 450px; overflow-y: auto;">""", unsafe_allow_html=True)
 
-            # Garantir que a coluna de data é datetime
-            df['data_de_desistência_do_curso'] = pd.to_datetime(df['data_de_desistência_do_curso'], errors='coerce')
-
-            # Filtrar linhas com data válida e motivo não nulo
-            df_filtered = df.dropna(subset=['data_de_desistência_do_curso', 'motivo_da_desistência'])
+            # Contagem por ano_mes e motivo (linhas sem data ou sem motivo ficam de fora)
+            desistencias_por_motivo_mes = fatiar(cubo, ['ano_mes', 'motivo_da_desistência'])
 
-            # Criar coluna 'ano_mes' com formato "YYYY-MM"
-            df_filtered['ano_mes'] = df_filtered['data_de_desistência_do_curso'].dt.to_period('M').astype(str)
-
-            # Agrupar por ano_mes e motivo da desistência, contando quantidade
-            desistencias_por_motivo_mes = (
-                df_filtered
-                .groupby(['ano_mes', 'motivo_da_desistência'])
-                .size()
-                .reset_index(name='quantidade')
-            )
+            # Período no formato "YYYY-MM" para o eixo temporal
+            desistencias_por_motivo_mes['ano_mes'] = desistencias_por_motivo_mes['ano_mes'].astype(str)
 
             # Ordenar pelo período para garantir sequência correta
             desistencias_por_motivo_mes = desistencias_por_motivo_mes.sort_values('ano_mes')
 
             # Gráfico de barras empilhadas Altair
-            stacked_bar = alt.Chart(desistencias_por_motivo_mes).mark_bar().encode(
-                x=alt.X('ano_mes:T', title='Mês/Ano'),
-                y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
-                color=alt.Color('motivo_da_desistência:N', title='Motivo da Desistência'),
-                tooltip=[
-                    alt.Tooltip('ano_mes:T', title='Mês/Ano'),
-                    alt.Tooltip('motivo_da_desistência:N', title='Motivo da Desistência'),
-                    alt.Tooltip('quantidade:Q', title='Quantidade')
-                ]
-            ).properties(
-                width=700,
-                height=400,
-                title='Desistências por Motivo ao longo do Tempo (Mês/Ano)'
-            ).configure_title(
-                fontSize=18,
-                fontWeight='bold',
-                anchor='start'
-            )
-
-            st.altair_chart(stacked_bar, use_container_width=True)
+            def stacked_bar():
+                return alt.Chart(desistencias_por_motivo_mes).mark_bar().encode(
+                    x=alt.X('ano_mes:T', title='Mês/Ano'),
+                    y=alt.Y('quantidade:Q', title='Quantidade de Desistências'),
+                    color=alt.Color('motivo_da_desistência:N', title='Motivo da Desistência'),
+                    tooltip=[
+                        alt.Tooltip('ano_mes:T', title='Mês/Ano'),
+                        alt.Tooltip('motivo_da_desistência:N', title='Motivo da Desistência'),
+                        alt.Tooltip('quantidade:Q', title='Quantidade')
+                    ]
+                ).properties(
+                    width=700,
+                    height=400,
+                    title='Desistências por Motivo ao longo do Tempo (Mês/Ano)'
+                ).configure_title(
+                    fontSize=18,
+                    fontWeight='bold',
+                    anchor='start'
+                )
+
+            exibir_grafico('motivo_mes', dados.versao, stacked_bar)
             st.markdown("</div>", unsafe_allow_html=True)
+        grafico_sob_demanda("📈 Gráfico das desistências por período do ano e motivo", "exp_periodo_motivo", grafico_periodo_motivo)
+
+def risco_desistencia(dados):
+    inject_animation_css()
+
+    st.markdown('<h1 class="custom-title fade-in fade-in-delay-1">Alunos em Risco de Desistência</h1>', unsafe_allow_html=True)
 
-# Mapeamento das páginas
+    st.markdown('''<p class="fade-in fade-in-delay-2">
+        Os alunos ativos são ordenados pelo risco de desistência estimado a partir do histórico da Escola da Nuvem
+        (faixa etária, renda familiar, origem, sexo, estado e situação de emprego). O risco serve para priorizar
+        o contato com os alunos, não como uma probabilidade exata.
+    </p>''', unsafe_allow_html=True)
+
+    # Tamanho de cada classe do treino: com poucos casos de um lado o modelo não é treinado
+    classes, modelo = dados['modelo_risco']
+    st.caption(
+        f"Histórico de treino: {classes['desistiram']:,} alunos que desistiram e {classes['nao_desistiram']:,} "
+        f"que não desistiram (mínimo de {MINIMO_POR_CLASSE} em cada).".replace(",", ".")
+    )
+    if modelo is None:
+        st.warning(
+            f"O histórico precisa de pelo menos {MINIMO_POR_CLASSE} alunos que desistiram e "
+            f"{MINIMO_POR_CLASSE} que não desistiram para treinar o modelo de risco."
+        )
+        return
+
+    # A planilha de alunos é opcional: sem ela a página mostra só o que o modelo aprendeu
+    if not os.path.exists(ARQUIVO_ALUNOS):
+        st.info(f"A planilha de alunos ({ARQUIVO_ALUNOS}) não foi encontrada; coloque-a na pasta do projeto para ver o ranking.")
+    else:
+        # Pontuação já feita para a versão das planilhas: aqui só se filtra e exibe
+        riscos = dados['risco_alunos']
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Alunos Ativos", f"{len(riscos):,}".replace(",", "."))
+        col2.metric("Em Risco Alto", f"{int((riscos['risco'] >= LIMIAR_RISCO_ALTO).sum()):,}".replace(",", "."))
+        col3.metric("Risco Médio", f"{riscos['risco'].mean():.0%}" if len(riscos) else "—")
+
+        quantidade = st.slider("Alunos no ranking", 10, 500, QUANTIDADE_RANKING, step=10, key="qtd_ranking_risco")
+        ranking = riscos.head(quantidade).rename(columns=lambda col: col.replace('_', ' ').capitalize())
+        st.dataframe(ranking, hide_index=True, use_container_width=True, column_config={
+            'Aluno': st.column_config.NumberColumn('Aluno', format='%d'),
+            'Turma': st.column_config.NumberColumn('Turma', format='%d'),
+            'Risco': st.column_config.ProgressColumn('Risco', format='percent', min_value=0, max_value=1),
+        })
+
+    def fatores():
+        tabela = modelo.fatores_de_risco()
+        st.markdown("**Valores que mais aumentam o risco**")
+        st.dataframe(tabela.head(10), hide_index=True, use_container_width=True)
+        st.markdown("**Valores que mais diminuem o risco**")
+        st.dataframe(tabela.tail(10).iloc[::-1], hide_index=True, use_container_width=True)
+    grafico_sob_demanda("⚖️ Pesos do modelo de risco", "exp_fatores_risco", fatores)
+
+# Mapeamento das páginas: cada uma declara os conjuntos de dados que usa, e só eles
+# são carregados quando ela é aberta
 page_names_to_funcs = {
-    "—": intro,
-    "Desistências": desistencias
+    "—": {
+        "func": intro,
+        "dados": ['cubo_perfil', 'picos_perfil', 'indice_perfil'],
+    },
+    "Desistências": {
+        "func": desistencias,
+        "dados": [
+            'cubo_perfil', 'cubo_desistencia', 'picos_periodo', 'diario_perfil', 'picos_semanais',
+            'previsao_desistencia',
+        ],
+    },
+    "Risco de Desistência": {
+        "func": risco_desistencia,
+        "dados": ['modelo_risco', 'risco_alunos'],
+    },
 }
 
-# Sidebar com logo
-try:
-    if os.path.exists(logo_path):
-        st.sidebar.image(logo_path, width=100)
-except Exception:
-    st.sidebar.warning("Logo não pôde ser carregada.")
-
-st.sidebar.markdown("""
-**Bem-vindo ao Projeto Extensor**  
-Escolha uma visualização para explorar os dados de desistências da Escola da Nuvem.
-""")
-
-# Selectbox com controle de estado
-selected = st.sidebar.selectbox(
-    "Escolha uma visualização",
-    options=page_names_to_funcs.keys(),
-    index=list(page_names_to_funcs.keys()).index(st.session_state.page)
-)
-if selected != st.session_state.page:
-    st.session_state.page = selected
-    st.rerun()
-
-# Renderizar página atual
-page_names_to_funcs[st.session_state.page]()
\ No newline at end of file
+# A navegação só roda como app (streamlit run); importado, o módulo expõe as páginas
+if __name__ == '__main__':
+    # Sidebar com logo
+    try:
+        if os.path.exists(logo_path):
+            st.sidebar.image(logo_path, width=100)
+    except Exception:
+        st.sidebar.warning("Logo não pôde ser carregada.")
+
+    st.sidebar.markdown("""
+    **Bem-vindo ao Projeto Extensor**  
+    Escolha uma visualização para explorar os dados de desistências da Escola da Nuvem.
+    """)
+
+    # Selectbox com controle de estado
+    selected = st.sidebar.selectbox(
+        "Escolha uma visualização",
+        options=page_names_to_funcs.keys(),
+        index=list(page_names_to_funcs.keys()).index(st.session_state.page)
+    )
+    if selected != st.session_state.page:
+        st.session_state.page = selected
+        st.rerun()
+
+    # Modo diagnóstico: tempo, memória e payload de cada carga, agregação e gráfico
+    st.sidebar.checkbox("Modo diagnóstico", key=CHAVE_ATIVO,
+                        help="Mede cada seção da página e mostra os tempos aqui na barra lateral.")
+    iniciar_execucao()
+
+    # Renderizar página atual
+    pagina = page_names_to_funcs[st.session_state.page]
+    with secao(f'página {st.session_state.page}', 'pagina'):
+        pagina["func"](DadosPagina(pagina["dados"]))
+    finalizar_execucao(pagina=st.session_state.page)
+    mostrar_datas_invalidas()
\ No newline at end of file
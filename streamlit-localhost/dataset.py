@@ -0,0 +1,139 @@
+import pandas as pd
+import streamlit as st
+
+from armazem import compartilhado
+from atualizacao import versao_servida
+from cache_colunar import ler_planilha, normalizar_janela
+from esquema import converter_datas
+from renda import SEM_INFORMACAO, faixas_de_renda
+
+# Os DataFrames em cache são compartilhados entre sessões (st.cache_resource).
+# Com copy-on-write, quem altera uma cópia rasa não mexe nos dados compartilhados;
+# no pandas 3 o modo já é sempre ligado.
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# Quantas versões de cada conjunto ficam em memória (as antigas são descartadas)
+MAX_VERSOES_CACHE = 4
+
+# Regras de limpeza compartilhadas por todas as páginas e gráficos
+ESTAGIOS_DESISTENCIA = ['Desistiu', 'Desistência']
+# Estágio das linhas sem estágio na planilha (o mesmo rótulo dos outros vazios)
+ESTAGIO_NAO_INFORMADO = SEM_INFORMACAO
+ANO_EXCLUIDO = 2026
+
+CORRECOES_MOTIVO = {
+    'Motivos de sáude/pessoal': 'Motivos de saúde/pessoal',
+    'Motivos de saúde/pessoal.': 'Motivos de saúde/pessoal'
+}
+
+COLUNAS_CATEGORICAS = [
+    'estado', 'origem', 'sexo', 'faixa_etária', 'estágio', 'motivo_da_desistência'
+]
+
+# Colunas derivadas que podem ser pedidas ao pipeline
+DERIVADAS = ('ano_mes', 'faixa_renda_familiar')
+
+# Colunas que a limpeza sempre usa e as de origem de cada derivada; com elas,
+# cada página lê da planilha só o que declarou (ver colunas_necessarias)
+COLUNAS_LIMPEZA = ['data_de_desistência_do_curso', 'estágio', 'motivo_da_desistência']
+ORIGEM_DERIVADAS = {
+    'ano_mes': ['data_de_desistência_do_curso'],
+    'faixa_renda_familiar': ['renda_familiar_mensal_aproximada'],
+}
+
+
+def compartilhar(df):
+    """Cópia rasa do DataFrame em cache: não duplica os dados, e com copy-on-write
+    qualquer alteração feita por quem chamou fica só na cópia dele."""
+    return df.copy(deep=False)
+
+
+def colunas_necessarias(colunas, derivadas=DERIVADAS):
+    """Colunas a ler da planilha para entregar ``colunas`` e ``derivadas`` depois da limpeza.
+
+    Com ``colunas=None`` todas são lidas.
+    """
+    if colunas is None:
+        return None
+    necessarias = set(COLUNAS_LIMPEZA).union(colunas)
+    for derivada in derivadas:
+        necessarias.update(ORIGEM_DERIVADAS[derivada])
+    # Ordenadas, para que a mesma projeção use sempre a mesma entrada do cache
+    return tuple(sorted(necessarias))
+
+
+def normalizar_colunas(df):
+    # Padroniza nomes colunas
+    df.columns = [col.strip().lower().replace(" ", "_") for col in df.columns]
+    return df
+
+
+def preparar(df, apenas_desistencias=True, derivadas=DERIVADAS):
+    """Aplica a limpeza padrão sobre o DataFrame bruto da planilha.
+
+    ``derivadas`` escolhe quais colunas calculadas (ver DERIVADAS) são criadas.
+    """
+    desconhecidas = set(derivadas) - set(DERIVADAS)
+    if desconhecidas:
+        raise ValueError(f"Colunas derivadas desconhecidas: {sorted(desconhecidas)}")
+
+    df = normalizar_colunas(df.copy())
+
+    # A leitura já converte as datas (esquema.py); aqui só cobrimos planilhas fora do esquema
+    df['data_de_desistência_do_curso'] = converter_datas(df['data_de_desistência_do_curso'])
+
+    if apenas_desistencias:
+        df = df[
+            (df['estágio'].isin(ESTAGIOS_DESISTENCIA)) &
+            (df['data_de_desistência_do_curso'].dt.year != ANO_EXCLUIDO)
+        ]
+
+    df['estágio'] = df['estágio'].astype(str).where(df['estágio'].notna(), ESTAGIO_NAO_INFORMADO)
+    df['motivo_da_desistência'] = df['motivo_da_desistência'].replace(CORRECOES_MOTIVO)
+    if 'ano_mes' in derivadas:
+        df['ano_mes'] = df['data_de_desistência_do_curso'].dt.to_period('M')
+
+    if 'faixa_renda_familiar' in derivadas and 'renda_familiar_mensal_aproximada' in df.columns:
+        df['faixa_renda_familiar'] = faixas_de_renda(df['renda_familiar_mensal_aproximada'])
+
+    # Categorias ajustadas depois do filtro, para não carregar valores que sumiram
+    for col in COLUNAS_CATEGORICAS:
+        if col not in df.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+        else:
+            df[col] = df[col].astype('category')
+
+    return df
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _prepare_dropouts(caminho, versao, apenas_desistencias, derivadas, colunas, meses):
+    # Montado uma vez por versão e mapeado por todos os processos (ver armazem.py)
+    return compartilhado(
+        'dados', (caminho, apenas_desistencias, derivadas, colunas, meses), versao,
+        lambda: preparar(ler_planilha(caminho, colunas, meses, versao), apenas_desistencias, derivadas)
+    )
+
+
+def prepare_dropouts(caminho='desistencia.xlsx', apenas_desistencias=True, derivadas=DERIVADAS, colunas=None,
+                     meses=None):
+    """Retorna o DataFrame limpo de desistências, recalculado só quando a planilha muda.
+
+    Com ``apenas_desistencias=False`` mantém todos os estágios (usado pelas páginas
+    de perfil, que contam todos os alunos da planilha). ``colunas`` lista as colunas
+    que quem chamou usa; só elas (e as da limpeza) são lidas e ficam em memória.
+    ``meses`` limita os dados a uma janela ``(inicio, fim)`` da data da desistência,
+    lendo só as partições desses meses (ver cache_colunar.ler_planilha).
+    """
+    # Ordem fixa para que ('a', 'b') e ('b', 'a') usem a mesma entrada do cache
+    derivadas = tuple(d for d in DERIVADAS if d in derivadas)
+    colunas = colunas_necessarias(colunas, derivadas)
+    meses = normalizar_janela(meses)
+    versao = versao_servida(
+        caminho, ('prepare_dropouts', apenas_desistencias, derivadas, colunas, meses),
+        lambda nova: _prepare_dropouts(caminho, nova, apenas_desistencias, derivadas, colunas, meses)
+    )
+    return compartilhar(_prepare_dropouts(caminho, versao, apenas_desistencias, derivadas, colunas, meses))
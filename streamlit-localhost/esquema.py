@@ -0,0 +1,204 @@
+import hashlib
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+# Tipos declarados para as planilhas de alunos/desistências, aplicados na leitura
+ESQUEMA = {
+    # Textos com poucos valores distintos viram categorias
+    'categorias': [
+        'estado', 'origem', 'sexo', 'faixa_etária', 'estágio', 'motivo_da_desistência',
+        'situação_de_emprego_atual', 'proprietário_do_matrícula', 'proprietário_do_matrícula_name',
+        'escolaridade', 'cor', 'identidade_de_gênero', 'uf', 'renda_familiar_mensal_aproximada',
+        'renda_individual_mensal', 'trabalhando?', 'está_matriculado?',
+    ],
+    # Inteiros que podem faltar (no Excel chegam como float)
+    'inteiros': {
+        'idade': 'Int16',
+        'quantas_pessoas_moram_na_casa': 'Int16',
+        'nota_final': 'Int16',
+        'última_nota_de_aprovação': 'Int16',
+        'at_-_aulas_ausentes': 'Int16',
+        'at_-_aulas_presentes': 'Int16',
+        'at_-_total_de_aulas_realizadas': 'Int16',
+        'pc_-_aulas_ausentes': 'Int16',
+        'pc_-_aulas_presentes': 'Int16',
+        'pc_-_total_de_aulas_realizadas': 'Int16',
+        'teste_matemática,_lógica_e_leitura': 'Int16',
+        'ifood': 'Int8',
+    },
+    # Datas e seus formatos na planilha (None: detectado na leitura, ver FORMATOS_DATA)
+    'datas': {
+        'data_de_desistência_do_curso': '%d/%m/%Y',
+        'data_de_nascimento': '%d/%m/%Y',
+        'data_de_resultado': '%d/%m/%Y',
+        'data_do_agendamento': '%d/%m/%Y',
+        'previsão_de_término': '%d/%m/%Y',
+        'data_final_da_última_aprovação': '%d/%m/%Y',
+        'hora_de_criação_x': '%d/%m/%Y %H:%M',
+        'hora_da_modificação_x': '%d/%m/%Y %H:%M',
+        'hora_da_última_atividade_x': '%d/%m/%Y %H:%M',
+        'hora_de_criação_y': '%d/%m/%Y %H:%M',
+        'hora_da_modificação_y': '%d/%m/%Y %H:%M',
+        'hora_da_última_atividade_y': '%d/%m/%Y %H:%M',
+        # Com e sem hora na mesma coluna ('2022-08-06' e '2022-08-06 10:00:00.000')
+        'data_sla': 'ISO8601',
+    },
+}
+
+# Demais colunas de texto viram categoria quando a fração de valores distintos
+# fica abaixo deste limite
+LIMIAR_CATEGORIA = 0.5
+
+# Formatos tentados, em ordem, quando a coluna de data não tem formato declarado
+FORMATOS_DATA = [
+    '%d/%m/%Y', '%d/%m/%Y %H:%M', '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f',
+]
+# Quantos valores distintos são usados para detectar o formato
+AMOSTRA_FORMATO = 200
+
+
+def versao_esquema(esquema=ESQUEMA):
+    """Identifica o esquema; as cópias colunares são refeitas quando ele muda."""
+    conteudo = json.dumps([esquema, LIMIAR_CATEGORIA], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(conteudo.encode('utf-8')).hexdigest()[:12]
+
+
+def _inteiro_anulavel(serie, tipo):
+    valores = pd.to_numeric(serie, errors='coerce')
+    preenchidos = valores.dropna()
+    info = np.iinfo(tipo.lower())
+    # Só converte se não houver casas decimais nem valores fora da faixa do tipo
+    if ((preenchidos % 1) == 0).all() and preenchidos.between(info.min, info.max).all():
+        return valores.astype(tipo)
+    return serie
+
+
+def detectar_formato(valores, formatos=FORMATOS_DATA, amostra=AMOSTRA_FORMATO):
+    """Primeiro formato que lê todos os valores da amostra, ou None se nenhum servir."""
+    amostra = pd.Index(valores).dropna()[:amostra]
+    for formato in formatos:
+        if pd.to_datetime(amostra, format=formato, errors='coerce').notna().all():
+            return formato
+    return None
+
+
+def _datas_com_alternativas(distintos, formato):
+    # Valores fora do formato declarado: os formatos conhecidos, ISO 8601 e, por
+    # último, o parser flexível (formatos explícitos primeiro, para '2023-03-04'
+    # não virar 3 de abril com o dayfirst)
+    datas = pd.to_datetime(distintos, format=formato, errors='coerce')
+    for alternativo in [*FORMATOS_DATA, 'ISO8601', 'mixed']:
+        falhas = np.flatnonzero(datas.isna() & pd.notna(distintos))
+        if not len(falhas):
+            break
+        lidas = pd.to_datetime(distintos[falhas], format=alternativo, dayfirst=alternativo == 'mixed', errors='coerce')
+        valores = datas.to_numpy(copy=True)
+        valores[falhas] = lidas.to_numpy(dtype=valores.dtype)
+        datas = pd.DatetimeIndex(valores)
+    return datas
+
+
+def converter_datas(serie, formato=None):
+    """Converte a coluna em datas lendo cada valor distinto uma única vez.
+
+    Sem ``formato``, ele é detectado uma vez (ver FORMATOS_DATA). Os valores que não
+    seguem o formato são lidos de novo com o parser flexível; só os que nem assim
+    viram data ficam NaT (ver datas_invalidas).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    # Planilhas repetem muito as datas: só os valores distintos passam pelo parser
+    codigos, distintos = pd.factorize(serie)
+    formato = formato or detectar_formato(distintos)
+    if formato is not None:
+        datas = _datas_com_alternativas(distintos, formato)
+    else:
+        datas = pd.to_datetime(distintos, format='mixed', dayfirst=True, errors='coerce')
+    return pd.Series(datas.take(codigos, allow_fill=True, fill_value=pd.NaT), index=serie.index, name=serie.name)
+
+
+def datas_invalidas(bruto, tipado, esquema=ESQUEMA):
+    """Valores preenchidos na planilha que não viraram data, por coluna (só as com falhas)."""
+    invalidas = {}
+    for col in esquema['datas']:
+        if col in bruto.columns and col in tipado.columns:
+            n = int((bruto[col].notna().to_numpy() & tipado[col].isna().to_numpy()).sum())
+            if n:
+                invalidas[col] = n
+    return invalidas
+
+
+def aplicar_esquema(df, esquema=ESQUEMA, limiar_categoria=LIMIAR_CATEGORIA):
+    """Converte as colunas para os tipos declarados (categorias, inteiros anuláveis e datas).
+
+    As datas são lidas só aqui, na carga; as páginas recebem as colunas já convertidas.
+    """
+    df = df.copy()
+
+    for col, formato in esquema['datas'].items():
+        if col in df.columns:
+            df[col] = converter_datas(df[col], formato)
+
+    for col, tipo in esquema['inteiros'].items():
+        if col in df.columns:
+            df[col] = _inteiro_anulavel(df[col], tipo)
+
+    for col in df.columns:
+        serie = df[col]
+        if isinstance(serie.dtype, pd.CategoricalDtype):
+            continue
+        declarada = col in esquema['categorias']
+        texto = pd.api.types.is_string_dtype(serie) or serie.dtype == object
+        if declarada or (texto and len(serie) and serie.nunique() / len(serie) < limiar_categoria):
+            df[col] = serie.astype('category')
+
+    return df
+
+
+def alinhar_categorias(*frames):
+    """Dá às colunas categóricas o mesmo conjunto de categorias em todos os DataFrames,
+    para que o concat entre eles continue categórico."""
+    frames = [df.copy(deep=False) for df in frames]
+    for col in frames[0].columns:
+        tipos = [df[col].dtype for df in frames if col in df.columns]
+        if not all(isinstance(tipo, pd.CategoricalDtype) for tipo in tipos) or len(set(tipos)) == 1:
+            continue
+        if len({pd.api.types.is_numeric_dtype(tipo.categories) for tipo in tipos}) > 1:
+            raise TypeError(f"Categorias incompatíveis na coluna '{col}'.")
+        categorias = tipos[0].categories
+        for tipo in tipos[1:]:
+            categorias = categorias.union(tipo.categories)
+        unificado = pd.CategoricalDtype(categorias, ordered=tipos[0].ordered)
+        for df in frames:
+            if col in df.columns:
+                df[col] = df[col].astype(unificado)
+    return frames
+
+
+def relatorio_memoria(df):
+    """Memória ocupada por coluna (em bytes e MB), da maior para a menor."""
+    memoria = df.memory_usage(deep=True, index=False)
+    relatorio = pd.DataFrame({
+        'coluna': memoria.index,
+        'tipo': [str(df[col].dtype) for col in memoria.index],
+        'bytes': memoria.values,
+    })
+    relatorio['MB'] = relatorio['bytes'] / 1e6
+    return relatorio.sort_values('bytes', ascending=False, ignore_index=True)
+
+
+if __name__ == '__main__':
+    # Uso: python esquema.py desistencia.xlsx
+    caminho = sys.argv[1] if len(sys.argv) > 1 else 'desistencia.xlsx'
+    bruto = pd.read_excel(caminho)
+    tipado = aplicar_esquema(bruto)
+    antes = relatorio_memoria(bruto)['bytes'].sum() / 1e6
+    depois = relatorio_memoria(tipado)
+    print(depois.head(25).to_string(index=False))
+    print(f"\nTotal: {antes:.2f} MB -> {depois['bytes'].sum() / 1e6:.2f} MB")
+    for col, n in datas_invalidas(bruto, tipado).items():
+        print(f"Datas inválidas em {col}: {n}")
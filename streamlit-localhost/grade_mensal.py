@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+# Séries mensais dos gráficos: contagens por mês (e categoria) numa grade densa,
+# com zero nos meses sem registro. As regras de janela e de meses excluídos são
+# declaradas em Periods, não em rótulos de texto.
+
+# A grade começa no mais tardar neste mês, mesmo que os dados comecem depois
+INICIO_MAXIMO = pd.Period('2024-10', freq='M')
+
+# Meses com poucos registros (início da coleta), deixados de fora dos gráficos
+MESES_INCOMPLETOS = pd.PeriodIndex(['2022-08', '2022-12', '2023-01'], freq='M')
+
+
+class GradeMensal:
+    """Contagens densas mês × categoria: ``valores[i, j]`` é a contagem do mês
+    ``periodos[i]`` na categoria ``categorias[j]`` (zero onde não houve registro)."""
+
+    def __init__(self, periodos, categorias, valores):
+        self.periodos = periodos
+        self.categorias = categorias
+        self.valores = valores
+
+    def sem_meses(self, meses):
+        manter = ~self.periodos.isin(pd.PeriodIndex(meses, freq='M'))
+        return GradeMensal(self.periodos[manter], self.categorias, self.valores[manter])
+
+    def sem_categorias(self, categorias):
+        manter = ~self.categorias.isin(categorias)
+        return GradeMensal(self.periodos, self.categorias[manter], self.valores[:, manter])
+
+    def serie(self):
+        """Total de cada mês (todas as categorias)."""
+        return pd.Series(self.valores.sum(axis=1), index=self.periodos)
+
+    def totais(self):
+        """Total de cada categoria no período da grade."""
+        return pd.Series(self.valores.sum(axis=0), index=self.categorias)
+
+    def longa(self, coluna_categoria, coluna_valor, coluna_mes='ano_mes'):
+        """Formato longo (uma linha por categoria e mês), como o Altair espera."""
+        n_meses, n_categorias = self.valores.shape
+        return pd.DataFrame({
+            coluna_mes: self.periodos[np.tile(np.arange(n_meses), n_categorias)],
+            coluna_categoria: self.categorias[np.repeat(np.arange(n_categorias), n_meses)],
+            coluna_valor: self.valores.T.ravel(),
+        })
+
+
+def grade_mensal(contagens, categoria=None, categorias=None, inicio_maximo=INICIO_MAXIMO, excluir=(),
+                 coluna_mes='ano_mes', coluna_valor='quantidade'):
+    """Monta a GradeMensal a partir de contagens já agregadas (ex.: cubo.fatiar).
+
+    Os meses vão do primeiro registro (ou ``inicio_maximo``, se for antes) ao último;
+    ``excluir`` tira meses da grade. Sem ``categoria`` a grade tem uma única coluna;
+    com uma lista de colunas, cada combinação presente é uma coluna (MultiIndex).
+    ``categorias`` fixa as colunas (as demais são descartadas); sem ela, entram os
+    valores presentes nas contagens, em ordem.
+    """
+    meses = pd.PeriodIndex(contagens[coluna_mes], freq='M')
+    if meses.notna().any():
+        inicio = meses.min() if inicio_maximo is None else min(meses.min(), pd.Period(inicio_maximo, freq='M'))
+        periodos = pd.period_range(inicio, meses.max(), freq='M', name=coluna_mes)
+    else:
+        periodos = pd.PeriodIndex([], freq='M', name=coluna_mes)
+
+    if categoria is None:
+        categorias = pd.Index([coluna_valor])
+        coluna = np.zeros(len(contagens), dtype=np.intp)
+    elif isinstance(categoria, (list, tuple)):
+        chaves = pd.MultiIndex.from_frame(contagens[list(categoria)])
+        if categorias is None:
+            categorias = chaves.unique().sort_values()
+        categorias = pd.MultiIndex.from_tuples(list(categorias), names=list(categoria))
+        coluna = categorias.get_indexer(chaves)
+    else:
+        if categorias is None:
+            categorias = sorted(contagens[categoria].dropna().unique().tolist())
+        categorias = pd.Index(categorias, name=categoria)
+        coluna = categorias.get_indexer(contagens[categoria])
+
+    linha = periodos.get_indexer(meses)
+    validas = (linha >= 0) & (coluna >= 0)
+    valores = np.zeros((len(periodos), len(categorias)), dtype=np.int64)
+    np.add.at(valores, (linha[validas], coluna[validas]), contagens[coluna_valor].to_numpy()[validas])
+
+    grade = GradeMensal(periodos, categorias, valores)
+    return grade.sem_meses(excluir) if len(excluir) else grade
@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from atualizacao import versao_servida
+from cache_colunar import COLUNA_DATA, ler_planilha
+from dataset import MAX_VERSOES_CACHE, colunas_necessarias, preparar
+
+# Índice temporal: as datas das desistências em ordem, com somas acumuladas das
+# medidas. Contagem, soma ou média de qualquer janela (últimos 30/90/180 dias etc.)
+# saem de duas buscas binárias, sem percorrer as linhas a cada execução da página.
+
+# Medidas numéricas acumuladas e dimensões com um índice próprio por valor
+MEDIDAS_INDICE = ['idade']
+DIMENSOES_INDICE = ['estado', 'motivo_da_desistência']
+COLUNAS_INDICE = colunas_necessarias([*MEDIDAS_INDICE, *DIMENSOES_INDICE], ())
+
+# NaT como inteiro (o menor int64): na ordenação, as linhas sem data ficam no começo
+_NAT = np.iinfo(np.int64).min
+
+
+def _nanossegundos(momento):
+    return pd.Timestamp(momento).as_unit('ns').value
+
+
+def _acumular(valores):
+    # Soma acumulada com um zero na frente: a soma das posições [i, j) é acumulado[j] - acumulado[i]
+    return np.concatenate([[0], np.cumsum(valores)])
+
+
+class IndiceTemporal:
+    """Datas ordenadas e somas acumuladas das medidas de um conjunto de linhas.
+
+    As janelas são intervalos ``[inicio, fim)``; pontas None ficam em aberto. Sem
+    nenhuma ponta entram todas as linhas, inclusive as sem data; com alguma ponta,
+    só as datadas.
+    """
+
+    def __init__(self, datas, medidas=None):
+        ordem = np.argsort(datas, kind='stable')
+        self.datas = datas[ordem]
+        self.sem_data = int(np.searchsorted(self.datas, _NAT, side='right'))
+        # Por medida: soma acumulada dos valores e quantidade acumulada de valores preenchidos
+        self._acumulados = {}
+        for nome, valores in (medidas or {}).items():
+            valores = np.asarray(valores, dtype=float)[ordem]
+            preenchidos = ~np.isnan(valores)
+            self._acumulados[nome] = (_acumular(np.where(preenchidos, valores, 0)), _acumular(preenchidos))
+        # Índices de cada valor das dimensões (ver construir_indice)
+        self.fatias = {}
+
+    def _posicoes(self, inicio, fim):
+        if inicio is None and fim is None:
+            return 0, len(self.datas)
+        i = self.sem_data if inicio is None else int(np.searchsorted(self.datas, _nanossegundos(inicio)))
+        j = len(self.datas) if fim is None else int(np.searchsorted(self.datas, _nanossegundos(fim)))
+        return i, max(i, j)
+
+    def contagem(self, inicio=None, fim=None):
+        i, j = self._posicoes(inicio, fim)
+        return j - i
+
+    def soma(self, medida, inicio=None, fim=None):
+        i, j = self._posicoes(inicio, fim)
+        somas, _ = self._acumulados[medida]
+        return float(somas[j] - somas[i])
+
+    def media(self, medida, inicio=None, fim=None):
+        """Média dos valores preenchidos da medida na janela (None se não houver nenhum)."""
+        i, j = self._posicoes(inicio, fim)
+        somas, preenchidos = self._acumulados[medida]
+        quantidade = preenchidos[j] - preenchidos[i]
+        return float(somas[j] - somas[i]) / quantidade if quantidade else None
+
+    def fatia(self, dimensao, valor):
+        """Índice só das linhas com ``dimensao == valor`` (vazio se o valor não aparece)."""
+        vazio = IndiceTemporal(np.array([], dtype=np.int64), {nome: [] for nome in self._acumulados})
+        return self.fatias[dimensao].get(valor, vazio)
+
+
+def construir_indice(df, coluna_data=COLUNA_DATA, medidas=MEDIDAS_INDICE, dimensoes=DIMENSOES_INDICE):
+    """IndiceTemporal das linhas de ``df``, com um índice por valor de cada dimensão."""
+    datas = df[coluna_data].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    valores = {m: df[m].to_numpy(dtype=float, na_value=np.nan) for m in medidas if m in df.columns}
+    indice = IndiceTemporal(datas, valores)
+    for dimensao in dimensoes:
+        if dimensao not in df.columns:
+            continue
+        grupos = df.groupby(dimensao, observed=True, sort=False).indices
+        indice.fatias[dimensao] = {
+            valor: IndiceTemporal(datas[posicoes], {m: v[posicoes] for m, v in valores.items()})
+            for valor, posicoes in grupos.items()
+        }
+    return indice
+
+
+def comparar_janelas(indice, dias, referencia=None, medida=None):
+    """Valor dos últimos ``dias`` até ``referencia`` (agora, por padrão) e a variação em
+    relação aos ``dias`` anteriores. Sem ``medida`` conta as linhas; com ela, tira a média.
+
+    A janela atual não tem fim: datas depois da referência (erros de digitação) também
+    entram, como no filtro ``>= referencia - dias`` que ela substitui.
+    """
+    inicio = pd.Timestamp(referencia if referencia is not None else pd.Timestamp.now()) - pd.Timedelta(days=dias)
+    inicio_anterior = inicio - pd.Timedelta(days=dias)
+    if medida is None:
+        atual, anterior = indice.contagem(inicio), indice.contagem(inicio_anterior, inicio)
+    else:
+        atual, anterior = indice.media(medida, inicio), indice.media(medida, inicio_anterior, inicio)
+    variacao = None if atual is None or anterior is None else atual - anterior
+    return atual, variacao
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _indice_desistencias(caminho, versao, apenas_desistencias):
+    return construir_indice(preparar(ler_planilha(caminho, COLUNAS_INDICE, versao=versao), apenas_desistencias, ()))
+
+
+def indice_desistencias(caminho='desistencia.xlsx', apenas_desistencias=True):
+    """Índice temporal da planilha, refeito (em segundo plano) só quando ela muda."""
+    versao = versao_servida(
+        caminho, ('indice', apenas_desistencias),
+        lambda nova: _indice_desistencias(caminho, nova, apenas_desistencias)
+    )
+    return _indice_desistencias(caminho, versao, apenas_desistencias)
@@ -0,0 +1,187 @@
+import json
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+
+import pandas as pd
+import streamlit as st
+from streamlit import config
+from streamlit.logger import set_log_level
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# O psutil é opcional: sem ele a memória é lida de /proc (Linux)
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Chaves do session_state: checkbox do modo diagnóstico e da gravação do trace
+CHAVE_ATIVO = 'perfilador'
+CHAVE_GRAVAR = 'perfilador_gravar'
+_CHAVE_SECOES = '_perfilador_secoes'
+_CHAVE_PILHA = '_perfilador_pilha'
+_CHAVE_INICIO = '_perfilador_inicio'
+
+# Arquivo onde cada seção medida vira uma linha (para análise fora do app)
+ARQUIVO_TRACE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perfilador_trace.jsonl')
+
+
+def memoria_processo():
+    """Memória residente (RSS) do processo em bytes, ou None se não der para medir."""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def silenciar_streamlit():
+    """Só erros no log do streamlit, para os scripts de medição (benchmark, teste de carga):
+    fora do streamlit run cada chamada st.* gera avisos."""
+    config.set_option('logger.level', 'error')
+    set_log_level('error')
+
+
+def ativo():
+    """Se o modo diagnóstico está ligado na sessão atual (sempre falso fora de uma sessão)."""
+    if get_script_run_ctx() is None:
+        return False
+    return bool(st.session_state.get(CHAVE_ATIVO, False))
+
+
+def iniciar_execucao():
+    """Zera as medições; chamado no começo de cada execução do script."""
+    st.session_state[_CHAVE_SECOES] = []
+    st.session_state[_CHAVE_PILHA] = []
+    st.session_state[_CHAVE_INICIO] = time.perf_counter()
+
+
+@contextmanager
+def secao(nome, tipo='secao'):
+    """Mede tempo, variação de memória e payload do bloco quando o modo diagnóstico está ligado."""
+    if not ativo() or _CHAVE_SECOES not in st.session_state:
+        yield
+        return
+
+    pilha = st.session_state[_CHAVE_PILHA]
+    registro = {
+        'secao': nome,
+        'tipo': tipo,
+        'nivel': len(pilha),
+        'inicio_ms': (time.perf_counter() - st.session_state[_CHAVE_INICIO]) * 1000,
+        'payload_bytes': 0,
+    }
+    memoria_antes = memoria_processo()
+    pilha.append(registro)
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        registro['ms'] = (time.perf_counter() - inicio) * 1000
+        memoria_depois = memoria_processo()
+        registro['memoria_delta_mb'] = (
+            (memoria_depois - memoria_antes) / 1e6 if None not in (memoria_antes, memoria_depois) else None
+        )
+        pilha.pop()
+        # O payload das seções internas também conta para as externas
+        if pilha:
+            pilha[-1]['payload_bytes'] += registro['payload_bytes']
+        st.session_state[_CHAVE_SECOES].append(registro)
+
+
+def _so_fragmento():
+    # Reexecução só de fragmentos (st.fragment): o resto do script não roda
+    ctx = get_script_run_ctx()
+    return bool(ctx is not None and ctx.fragment_ids_this_run)
+
+
+@contextmanager
+def fragmento(nome):
+    """Seção do corpo de um fragmento (st.fragment).
+
+    Numa execução completa é só mais uma seção. Quando o fragmento roda sozinho (ex.:
+    ao abrir um expander), iniciar_execucao e finalizar_execucao não são chamados e a
+    barra lateral não é redesenhada: as medições recomeçam aqui e a tabela aparece
+    dentro do próprio fragmento.
+    """
+    if not ativo() or not _so_fragmento():
+        with secao(nome, 'fragmento'):
+            yield
+        return
+
+    iniciar_execucao()
+    with secao(nome, 'fragmento'):
+        yield
+    finalizar_execucao(destino=st.container(border=True), fragmento=nome)
+
+
+def registrar_payload(tamanho):
+    """Soma bytes enviados ao navegador na seção em andamento."""
+    pilha = st.session_state.get(_CHAVE_PILHA) if ativo() else None
+    if pilha:
+        pilha[-1]['payload_bytes'] += tamanho
+
+
+def medir(tipo):
+    """Decorador: cada chamada da função vira uma seção com o nome dela."""
+    def decorador(funcao):
+        nome = f'{funcao.__module__}.{funcao.__name__}'
+
+        @wraps(funcao)
+        def medida(*args, **kwargs):
+            if not ativo():
+                return funcao(*args, **kwargs)
+            with secao(nome, tipo):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def gravar_trace(secoes, contexto, caminho=ARQUIVO_TRACE):
+    with open(caminho, 'a', encoding='utf-8') as f:
+        for registro in secoes:
+            f.write(json.dumps({**contexto, **registro}, ensure_ascii=False) + '\n')
+
+
+def finalizar_execucao(destino=None, **contexto):
+    """Mostra as medições da execução na barra lateral (ou em ``destino``, dentro de um
+    fragmento) e, se pedido, grava o trace."""
+    if not ativo() or _CHAVE_SECOES not in st.session_state:
+        return
+
+    total_ms = (time.perf_counter() - st.session_state[_CHAVE_INICIO]) * 1000
+    # Em ordem de início, com as seções internas recuadas
+    secoes = sorted(st.session_state[_CHAVE_SECOES], key=lambda r: r['inicio_ms'])
+
+    na_barra_lateral = destino is None
+    if na_barra_lateral:
+        destino = st.sidebar.expander("Diagnóstico da execução", expanded=True)
+    with destino:
+        if not na_barra_lateral:
+            st.caption(f"Diagnóstico da reexecução do fragmento {contexto.get('fragmento', '')}")
+        payload = sum(r['payload_bytes'] for r in secoes if r['nivel'] == 0)
+        st.caption(f"Execução: {total_ms:.0f} ms · payload dos gráficos: {payload / 1024:.1f} KB")
+        if secoes:
+            tabela = pd.DataFrame({
+                'seção': ['  ' * r['nivel'] + r['secao'] for r in secoes],
+                'tipo': [r['tipo'] for r in secoes],
+                'ms': [round(r['ms'], 1) for r in secoes],
+                'memória Δ (MB)': [
+                    round(r['memoria_delta_mb'], 2) if r['memoria_delta_mb'] is not None else None for r in secoes
+                ],
+                'payload (KB)': [round(r['payload_bytes'] / 1024, 1) for r in secoes],
+            })
+            st.dataframe(tabela, hide_index=True)
+        # O checkbox fica só na barra lateral (a chave do widget é única)
+        if na_barra_lateral:
+            st.checkbox("Gravar trace em JSONL", key=CHAVE_GRAVAR, help=ARQUIVO_TRACE)
+
+    if st.session_state.get(CHAVE_GRAVAR):
+        gravar_trace(secoes + [{'secao': 'execucao', 'tipo': 'total', 'nivel': -1, 'ms': total_ms}], {
+            'horario': datetime.now().isoformat(timespec='milliseconds'),
+            **contexto,
+        })
@@ -0,0 +1,222 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from atualizacao import versao_servida
+from cache_colunar import COLUNA_DATA, normalizar_janela
+from cubo import _contagem_diaria, _cubo_desistencias, fatiar
+from dataset import MAX_VERSOES_CACHE, compartilhar
+from grade_mensal import GradeMensal, grade_mensal
+
+# Detecção de picos nas séries mensais (e semanais) de desistências. Cada período é
+# comparado com os anteriores (z-score móvel) e com o mesmo período do ano anterior
+# (base sazonal). O resultado fica em cache por versão da planilha, e uma versão
+# nova só recalcula os períodos a partir do primeiro que mudou.
+
+# Períodos anteriores usados como referência do z-score (o próprio período não entra)
+JANELA_PICOS = 6
+# Mínimo de períodos anteriores para o z-score valer
+HISTORICO_MINIMO = 3
+# z-score a partir do qual o período é um pico
+LIMIAR_Z = 2.0
+# Pico sazonal: pelo menos esta razão sobre o mesmo período do ano anterior, e acima
+# do período anterior (uma queda dentro do ano, como 52 → 28, não é pico)
+FATOR_SAZONAL = 2.0
+# Períodos com menos desistências que isto nunca são picos (evita "picos" de 1 para 3)
+# nem servem de base sazonal (o começo da coleta multiplicaria tudo no ano seguinte)
+QUANTIDADE_MINIMA_PICO = 5
+# Máximo de períodos em um ano, por frequência (anos ISO têm 52 ou 53 semanas):
+# histórico recalculado antes da primeira mudança na detecção incremental
+PERIODOS_POR_ANO = {'M': 12, 'W': 53}
+# Séries acompanhadas: o total do mês (None) e cada valor destas dimensões do cubo
+DIMENSOES_PICOS = [None, 'motivo_da_desistência', 'estado']
+
+
+class DeteccaoPicos:
+    """Resultado da detecção sobre uma grade (períodos × categorias): média e desvio
+    dos períodos anteriores, z-score, base sazonal e as marcações de pico."""
+
+    def __init__(self, grade, media, desvio, z, base_sazonal, pico_z, pico_sazonal):
+        self.grade = grade
+        self.media = media
+        self.desvio = desvio
+        self.z = z
+        self.base_sazonal = base_sazonal
+        self.pico_z = pico_z
+        self.pico_sazonal = pico_sazonal
+
+    @property
+    def pico(self):
+        return self.pico_z | self.pico_sazonal
+
+    def tabela(self, coluna_categoria='categoria', coluna_periodo='ano_mes'):
+        """Formato longo: uma linha por período e categoria, com as estatísticas e as marcações."""
+        periodos, categorias = self.grade.periodos, self.grade.categorias
+        n_periodos, n_categorias = self.grade.valores.shape
+        linhas = np.tile(np.arange(n_periodos), n_categorias)
+        colunas = np.repeat(np.arange(n_categorias), n_periodos)
+        return pd.DataFrame({
+            coluna_periodo: periodos[linhas],
+            coluna_categoria: categorias[colunas],
+            'quantidade': self.grade.valores.T.ravel(),
+            'media': self.media.T.ravel(),
+            'desvio': self.desvio.T.ravel(),
+            'z': self.z.T.ravel(),
+            'base_sazonal': self.base_sazonal.T.ravel(),
+            'pico_z': self.pico_z.T.ravel(),
+            'pico_sazonal': self.pico_sazonal.T.ravel(),
+            'pico': self.pico.T.ravel(),
+        })
+
+    def em_alta(self):
+        """Categorias com pico em cada período (só os períodos que têm alguma)."""
+        linhas, colunas = np.nonzero(self.pico)
+        categorias = pd.Series(self.grade.categorias[colunas], index=self.grade.periodos[linhas])
+        return categorias.groupby(level=0, sort=False).agg(list)
+
+
+def _estatisticas_anteriores(valores, janela):
+    # Média, desvio e quantidade dos ``janela`` períodos anteriores a cada um (somas acumuladas)
+    zeros = np.zeros((1, valores.shape[1]))
+    somas = np.vstack([zeros, np.cumsum(valores, axis=0)])
+    quadrados = np.vstack([zeros, np.cumsum(valores ** 2, axis=0)])
+    fim = np.arange(len(valores))
+    inicio = np.maximum(fim - janela, 0)
+    quantidade = (fim - inicio)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        media = (somas[fim] - somas[inicio]) / quantidade
+        variancia = (quadrados[fim] - quadrados[inicio]) / quantidade - media ** 2
+    return media, np.sqrt(np.maximum(variancia, 0)), quantidade
+
+
+def posicoes_ano_anterior(periodos):
+    """Posição, em ``periodos``, do mesmo período do ano anterior (-1 se não houver).
+
+    Meses comparam com o mesmo mês; semanas, com o mesmo número de semana ISO (um
+    deslocamento fixo de 52 semanas escorrega uma semana a cada ano de 53).
+    """
+    if periodos.freqstr[0] == 'W':
+        calendario = periodos.start_time.isocalendar()
+        ano, numero = calendario['year'].to_numpy(dtype=np.int64), calendario['week'].to_numpy(dtype=np.int64)
+    else:
+        ano, numero = periodos.year.to_numpy(dtype=np.int64), periodos.month.to_numpy(dtype=np.int64)
+    chaves = pd.Index(ano * 100 + numero)
+    return chaves.get_indexer((ano - 1) * 100 + numero)
+
+
+def _detectar(valores, ano_anterior, janela, limiar_z, fator_sazonal, minimo):
+    valores = valores.astype(float)
+    media, desvio, quantidade = _estatisticas_anteriores(valores, janela)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (valores - media) / desvio
+    # Sem variação nos anteriores: qualquer aumento é um desvio "infinito"
+    z = np.where(desvio > 0, z, np.where(valores > media, np.inf, 0.0))
+    suficiente = valores >= minimo
+    pico_z = suficiente & (quantidade >= HISTORICO_MINIMO) & (z >= limiar_z)
+
+    # Base sazonal: o mesmo período do ano anterior (``ano_anterior``: posições, -1 sem base)
+    base_sazonal = np.full_like(valores, np.nan)
+    com_base = ano_anterior >= 0
+    base_sazonal[com_base] = valores[ano_anterior[com_base]]
+    subiu = np.zeros(valores.shape, dtype=bool)
+    subiu[1:] = valores[1:] > valores[:-1]
+    with np.errstate(invalid='ignore'):
+        pico_sazonal = suficiente & subiu & (base_sazonal >= minimo) & (valores >= fator_sazonal * base_sazonal)
+    return media, desvio, z, base_sazonal, pico_z, pico_sazonal
+
+
+def _primeira_mudanca(grade, anterior):
+    # Primeiro período em que a grade difere da detecção anterior (len(grade) se nenhum)
+    if anterior is None or not grade.categorias.equals(anterior.grade.categorias):
+        return 0
+    n = min(len(grade.periodos), len(anterior.grade.periodos))
+    iguais = (grade.periodos[:n] == anterior.grade.periodos[:n]) & \
+        (grade.valores[:n] == anterior.grade.valores[:n]).all(axis=1)
+    return n if iguais.all() else int(np.argmin(iguais))
+
+
+def detectar_picos(grade, anterior=None, janela=JANELA_PICOS, limiar_z=LIMIAR_Z,
+                   fator_sazonal=FATOR_SAZONAL, minimo=QUANTIDADE_MINIMA_PICO):
+    """Marca os picos de cada categoria da GradeMensal (ou semanal).
+
+    Cada período só depende dele e dos anteriores; com a ``anterior`` (detecção da
+    versão passada), os períodos até o primeiro que mudou são reaproveitados e só os
+    seguintes são recalculados.
+    """
+    periodos_por_ano = PERIODOS_POR_ANO.get(grade.periodos.freqstr[0], 12)
+    mudanca = _primeira_mudanca(grade, anterior)
+    # Histórico necessário para recalcular a partir da mudança
+    inicio = max(mudanca - max(janela, periodos_por_ano), 0)
+    # Posições relativas ao trecho recalculado (bases antes dele só valem para períodos reaproveitados)
+    ano_anterior = posicoes_ano_anterior(grade.periodos[inicio:])
+    novos = _detectar(grade.valores[inicio:], ano_anterior, janela, limiar_z, fator_sazonal, minimo)
+    if mudanca == 0:
+        return DeteccaoPicos(grade, *novos)
+    antigos = (anterior.media, anterior.desvio, anterior.z, anterior.base_sazonal, anterior.pico_z, anterior.pico_sazonal)
+    partes = [np.concatenate([antigo[:mudanca], novo[mudanca - inicio:]]) for antigo, novo in zip(antigos, novos)]
+    return DeteccaoPicos(grade, *partes)
+
+
+def grade_do_cubo(cubo, dimensao=None, sem_nulos=()):
+    """GradeMensal do total (``dimensao=None``) ou de cada valor de ``dimensao``, desde o primeiro mês com registro."""
+    dimensoes = ['ano_mes'] if dimensao is None else ['ano_mes', dimensao]
+    return grade_mensal(fatiar(cubo, dimensoes, sem_nulos=list(sem_nulos)), categoria=dimensao, inicio_maximo=None)
+
+
+def grade_semanal(diaria, coluna_data=COLUNA_DATA, coluna_valor='quantidade'):
+    """Total por semana (semanas sem registro com zero) a partir das contagens diárias."""
+    semanas = diaria[coluna_data].dt.to_period('W')
+    totais = diaria[coluna_valor].groupby(semanas).sum()
+    if len(totais):
+        periodos = pd.period_range(totais.index.min(), totais.index.max(), freq='W', name='semana')
+    else:
+        periodos = pd.PeriodIndex([], freq='W', name='semana')
+    valores = totais.reindex(periodos, fill_value=0).to_numpy(dtype=np.int64)[:, None]
+    return GradeMensal(periodos, pd.Index([coluna_valor]), valores)
+
+
+@st.cache_resource(show_spinner=False)
+def _deteccoes_recentes():
+    # Última detecção de cada série, ponto de partida da próxima versão
+    return {}
+
+
+def _detectar_com_cache(chave, grade):
+    recentes = _deteccoes_recentes()
+    deteccao = detectar_picos(grade, anterior=recentes.get(chave))
+    recentes[chave] = deteccao
+    return deteccao
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _picos_mensais(caminho, versao, apenas_desistencias, dimensao, sem_nulos, meses):
+    cubo = compartilhar(_cubo_desistencias(caminho, versao, apenas_desistencias, meses))
+    grade = grade_do_cubo(cubo, dimensao, sem_nulos)
+    return _detectar_com_cache(('mensal', caminho, apenas_desistencias, dimensao, sem_nulos, meses), grade)
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _picos_semanais(caminho, versao, apenas_desistencias, meses):
+    grade = grade_semanal(compartilhar(_contagem_diaria(caminho, versao, apenas_desistencias, meses)))
+    return _detectar_com_cache(('semanal', caminho, apenas_desistencias, meses), grade)
+
+
+def picos_mensais(caminho='desistencia.xlsx', apenas_desistencias=True, dimensao=None, sem_nulos=(), meses=None):
+    """Detecção de picos por mês no total (``dimensao=None``) ou em cada valor de ``dimensao``
+    (ex.: 'motivo_da_desistência', 'estado'), a partir do cubo já em cache."""
+    sem_nulos, meses = tuple(sem_nulos), normalizar_janela(meses)
+    versao = versao_servida(
+        caminho, ('picos_mensais', apenas_desistencias, dimensao, sem_nulos, meses),
+        lambda nova: _picos_mensais(caminho, nova, apenas_desistencias, dimensao, sem_nulos, meses)
+    )
+    return _picos_mensais(caminho, versao, apenas_desistencias, dimensao, sem_nulos, meses)
+
+
+def picos_semanais(caminho='desistencia.xlsx', apenas_desistencias=True, meses=None):
+    """Detecção de picos no total por semana, a partir da contagem diária já em cache."""
+    meses = normalizar_janela(meses)
+    versao = versao_servida(
+        caminho, ('picos_semanais', apenas_desistencias, meses),
+        lambda nova: _picos_semanais(caminho, nova, apenas_desistencias, meses)
+    )
+    return _picos_semanais(caminho, versao, apenas_desistencias, meses)
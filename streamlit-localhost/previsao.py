@@ -0,0 +1,207 @@
+import itertools
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from atualizacao import versao_servida
+from calendario import rotular
+from cubo import _cubo_desistencias, fatiar
+from dataset import MAX_VERSOES_CACHE, compartilhar
+from grade_mensal import grade_mensal
+
+# Previsão das desistências por mês: o total do gráfico mensal e cada série
+# motivo × estado são ajustadas juntas, numa só passada em NumPy (as séries são as
+# colunas de uma matriz). Cada série fica com o modelo de menor erro entre o
+# sazonal ingênuo (mesmo mês do ano anterior) e o Holt-Winters aditivo. Modelos e
+# previsões ficam em cache por versão da planilha; as páginas só os desenham.
+
+# Meses previstos depois do último mês com dados
+HORIZONTE_PREVISAO = 6
+# Meses em um ciclo sazonal
+PERIODO_SAZONAL = 12
+# Largura da faixa em desvios dos resíduos (1,28: faixa de ~80%)
+Z_FAIXA = 1.28
+# Combinações de suavização (nível, tendência, sazonalidade) testadas para cada série
+PARAMETROS_HOLT_WINTERS = list(itertools.product([0.2, 0.5, 0.8], [0.0, 0.1], [0.1, 0.3]))
+# Séries previstas além do total
+DIMENSOES_PREVISAO = ['motivo_da_desistência', 'estado']
+
+MODELOS = ['media', 'sazonal_ingenuo', 'holt_winters']
+
+
+class PrevisaoMensal:
+    """Previsões de várias séries: ``valores[h, j]`` é a previsão do mês ``periodos[h]`` para a
+    série ``categorias[j]``, com a faixa em ``inferior``/``superior``; ``modelos[j]`` é o modelo
+    escolhido e ``erros[j]`` o erro médio absoluto dele nos meses já observados."""
+
+    def __init__(self, periodos, categorias, valores, inferior, superior, modelos, erros):
+        self.periodos = periodos
+        self.categorias = categorias
+        self.valores = valores
+        self.inferior = inferior
+        self.superior = superior
+        self.modelos = modelos
+        self.erros = erros
+
+    def longa(self, coluna_mes='ano_mes'):
+        """Formato longo (uma linha por série e mês), com as colunas das categorias separadas."""
+        n_meses, n_series = self.valores.shape
+        series = np.repeat(np.arange(n_series), n_meses)
+        if isinstance(self.categorias, pd.MultiIndex):
+            df = self.categorias[series].to_frame(index=False)
+        else:
+            df = pd.DataFrame({self.categorias.name or 'serie': self.categorias[series]})
+        df.insert(0, coluna_mes, self.periodos[np.tile(np.arange(n_meses), n_series)])
+        df['previsao'] = self.valores.T.ravel()
+        df['inferior'] = self.inferior.T.ravel()
+        df['superior'] = self.superior.T.ravel()
+        df['modelo'] = np.asarray(MODELOS, dtype=object)[self.modelos[series]]
+        return df
+
+
+def _holt_winters(valores, periodo, horizonte, parametros):
+    """Holt-Winters aditivo para todas as séries e combinações de parâmetros de uma vez.
+
+    Retorna os erros de um passo nos meses depois do primeiro ciclo (C × T-periodo × S)
+    e as previsões (C × horizonte × S).
+    """
+    n_meses = len(valores)
+    alfa, beta, gama = (np.array(p, dtype=float)[:, None] for p in zip(*parametros))
+    primeiro = valores[:periodo]
+    nivel = np.broadcast_to(primeiro.mean(axis=0), (len(parametros), valores.shape[1])).copy()
+    if n_meses >= 2 * periodo:
+        tendencia = (valores[periodo:2 * periodo].mean(axis=0) - primeiro.mean(axis=0)) / periodo
+    else:
+        tendencia = np.zeros(valores.shape[1])
+    tendencia = np.broadcast_to(tendencia, nivel.shape).copy()
+    sazonal = np.broadcast_to(primeiro - primeiro.mean(axis=0), (len(parametros), *primeiro.shape))
+    sazonal = sazonal.transpose(1, 0, 2).copy()
+
+    erros = np.empty((len(parametros), n_meses - periodo, valores.shape[1]))
+    for t in range(periodo, n_meses):
+        s = t % periodo
+        erros[:, t - periodo] = valores[t] - (nivel + tendencia + sazonal[s])
+        novo_nivel = alfa * (valores[t] - sazonal[s]) + (1 - alfa) * (nivel + tendencia)
+        tendencia = beta * (novo_nivel - nivel) + (1 - beta) * tendencia
+        sazonal[s] = gama * (valores[t] - novo_nivel) + (1 - gama) * sazonal[s]
+        nivel = novo_nivel
+
+    passos = np.arange(1, horizonte + 1)
+    futuros = sazonal[(n_meses + passos - 1) % periodo]
+    previsoes = nivel[:, None] + passos[None, :, None] * tendencia[:, None] + futuros.transpose(1, 0, 2)
+    return erros, previsoes
+
+
+def prever_series(valores, horizonte=HORIZONTE_PREVISAO, periodo=PERIODO_SAZONAL, parametros=PARAMETROS_HOLT_WINTERS):
+    """Ajusta os modelos a cada coluna de ``valores`` (meses × séries) e prevê ``horizonte`` meses.
+
+    Retorna (previsões, inferior, superior, modelo de cada série, erro médio absoluto),
+    com previsões e faixas em meses × séries e sem valores negativos.
+    """
+    valores = np.asarray(valores, dtype=float)
+    n_meses, n_series = valores.shape
+    passos = np.arange(1, horizonte + 1)[:, None]
+
+    # Sem um ciclo completo: média dos meses observados
+    media = valores.mean(axis=0) if n_meses else np.zeros(n_series)
+    previsao = np.broadcast_to(media, (horizonte, n_series)).copy()
+    desvio = valores.std(axis=0) if n_meses else np.zeros(n_series)
+    largura = np.broadcast_to(desvio, (horizonte, n_series)).copy()
+    modelo = np.zeros(n_series, dtype=np.int8)
+    erro = np.abs(valores - media).mean(axis=0) if n_meses else np.zeros(n_series)
+
+    if n_meses > periodo:
+        # Sazonal ingênuo: o mesmo mês do último ciclo
+        residuos = valores[periodo:] - valores[:-periodo]
+        erro = np.abs(residuos).mean(axis=0)
+        previsao = valores[n_meses - periodo + (passos[:, 0] - 1) % periodo]
+        ciclos = (passos - 1) // periodo + 1
+        largura = np.sqrt((residuos ** 2).mean(axis=0)) * np.sqrt(ciclos)
+        modelo[:] = MODELOS.index('sazonal_ingenuo')
+
+        # Holt-Winters: melhor combinação de parâmetros por série, se errar menos
+        erros_hw, previsoes_hw = _holt_winters(valores, periodo, horizonte, parametros)
+        erro_hw = np.abs(erros_hw).mean(axis=1)
+        melhor = erro_hw.argmin(axis=0)
+        colunas = np.arange(n_series)
+        erro_melhor = erro_hw[melhor, colunas]
+        usar = erro_melhor < erro
+        desvio_hw = np.sqrt((erros_hw[melhor, :, colunas] ** 2).mean(axis=1))
+        previsao = np.where(usar, previsoes_hw[melhor, :, colunas].T, previsao)
+        largura = np.where(usar, desvio_hw * np.sqrt(passos), largura)
+        erro = np.where(usar, erro_melhor, erro)
+        modelo[usar] = MODELOS.index('holt_winters')
+
+    previsao = np.maximum(previsao, 0)
+    return previsao, np.maximum(previsao - Z_FAIXA * largura, 0), previsao + Z_FAIXA * largura, modelo, erro
+
+
+def _meses_seguintes(periodos, horizonte):
+    if not len(periodos):
+        return pd.PeriodIndex([], freq='M', name=periodos.name)
+    return pd.period_range(periodos[-1] + 1, periods=horizonte, freq='M', name=periodos.name)
+
+
+def previsoes_do_cubo(cubo, dimensoes=DIMENSOES_PREVISAO, horizonte=HORIZONTE_PREVISAO):
+    """Previsões do total mensal (o mesmo do gráfico por mês) e de cada combinação das ``dimensoes``.
+
+    As séries são montadas nos mesmos meses e ajustadas numa única chamada.
+    Retorna {'total': PrevisaoMensal, 'series': PrevisaoMensal, 'historico': GradeMensal do total}.
+    """
+    total = grade_mensal(fatiar(cubo, ['ano_mes']))
+    series = grade_mensal(fatiar(cubo, ['ano_mes', *dimensoes]), categoria=list(dimensoes))
+    # Mesmos meses do total (a grade das séries pode começar ou terminar em outro mês)
+    linhas = total.periodos.get_indexer(series.periodos)
+    valores = np.zeros((len(total.periodos), series.valores.shape[1]), dtype=np.int64)
+    valores[linhas[linhas >= 0]] = series.valores[linhas >= 0]
+
+    periodos = _meses_seguintes(total.periodos, horizonte)
+    previsto, inferior, superior, modelos, erros = prever_series(np.hstack([total.valores, valores]), len(periodos))
+    partes = {'total': (total.categorias, slice(0, 1)), 'series': (series.categorias, slice(1, None))}
+    resultado = {
+        nome: PrevisaoMensal(
+            periodos, categorias, previsto[:, colunas], inferior[:, colunas], superior[:, colunas],
+            modelos[colunas], erros[colunas],
+        )
+        for nome, (categorias, colunas) in partes.items()
+    }
+    resultado['historico'] = total
+    return resultado
+
+
+def camadas_previsao(previsao, ordem):
+    """Faixa e linha tracejada dos meses previstos (série total), no mesmo eixo de rótulos."""
+    df_previsao = previsao.longa()
+    df_previsao['mes_ano'] = rotular(df_previsao['ano_mes'])
+    df_previsao = df_previsao.drop(columns='ano_mes')
+    x = alt.X('mes_ano:N', sort=ordem)
+    faixa = alt.Chart(df_previsao).mark_area(opacity=0.2, color='#ff7f0e').encode(
+        x=x, y='inferior:Q', y2='superior:Q'
+    )
+    linha = alt.Chart(df_previsao).mark_line(point=True, strokeDash=[4, 4], color='#ff7f0e').encode(
+        x=x,
+        y='previsao:Q',
+        tooltip=[
+            alt.Tooltip('mes_ano:N', title='Mês/Ano'),
+            alt.Tooltip('previsao:Q', title='Previsão', format='.0f'),
+            alt.Tooltip('inferior:Q', title='Mínimo provável', format='.0f'),
+            alt.Tooltip('superior:Q', title='Máximo provável', format='.0f'),
+            alt.Tooltip('modelo:N', title='Modelo'),
+        ]
+    )
+    return faixa + linha
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _previsoes(caminho, versao, apenas_desistencias):
+    return previsoes_do_cubo(compartilhar(_cubo_desistencias(caminho, versao, apenas_desistencias)))
+
+
+def previsoes(caminho='desistencia.xlsx', apenas_desistencias=True):
+    """Previsões ajustadas uma vez por versão da planilha (em segundo plano, ver atualizacao.py)."""
+    versao = versao_servida(
+        caminho, ('previsoes', apenas_desistencias), lambda nova: _previsoes(caminho, nova, apenas_desistencias)
+    )
+    return _previsoes(caminho, versao, apenas_desistencias)
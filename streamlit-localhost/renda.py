@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+# Limites superiores (inclusivos) de cada faixa de renda, em reais
+LIMITES_RENDA = [1000, 2000, 4000]
+ROTULOS_RENDA = ['Até R$1.000', 'R$1.001 - R$2.000', 'R$2.001 - R$4.000', 'Acima de R$4.000']
+SEM_INFORMACAO = 'Não informado'
+
+
+def valores_em_reais(serie):
+    """Converte textos como 'R$ 3,000.00' ou 'R$ 3.000,00' em números, sem apply."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float)
+
+    # Os valores se repetem muito: convertemos só os distintos e espalhamos pelos códigos
+    codigos, distintos = pd.factorize(serie)
+    texto = pd.Series(distintos).astype('string').str.replace(r'R\$|\s', '', regex=True)
+    # Os centavos vêm depois do último separador; descartamos antes de tirar os separadores de milhar
+    texto = texto.str.replace(r'[.,]\d{1,2}$', '', regex=True)
+    texto = texto.str.replace(r'[.,]', '', regex=True)
+    valores = pd.to_numeric(texto, errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+
+    resultado = np.full(len(codigos), np.nan)
+    validos = codigos >= 0
+    resultado[validos] = valores[codigos[validos]]
+    return pd.Series(resultado, index=serie.index, name=serie.name)
+
+
+def faixas_de_renda(serie, limites=LIMITES_RENDA, rotulos=ROTULOS_RENDA):
+    """Classifica a renda em faixas (categórica), com 'Não informado' para valores inválidos."""
+    if len(rotulos) != len(limites) + 1:
+        raise ValueError("É preciso um rótulo a mais que o número de limites.")
+
+    faixas = pd.cut(
+        valores_em_reais(serie),
+        bins=[-np.inf, *limites, np.inf],
+        labels=rotulos,
+        right=True,
+    )
+    return faixas.cat.add_categories(SEM_INFORMACAO).fillna(SEM_INFORMACAO)
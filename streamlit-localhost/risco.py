@@ -0,0 +1,233 @@
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from atualizacao import versao_servida
+from cache_colunar import ler_planilha
+from dataset import (
+    ESTAGIO_NAO_INFORMADO, ESTAGIOS_DESISTENCIA, MAX_VERSOES_CACHE, colunas_necessarias, normalizar_colunas, preparar,
+)
+from renda import SEM_INFORMACAO, faixas_de_renda
+
+# Risco de desistência: uma regressão logística em NumPy, treinada no histórico de
+# desistências (quem desistiu × quem terminou o curso) sobre os fatores de perfil.
+# Todos os fatores são categóricos, então o treino agrupa as combinações repetidas e
+# a pontuação de cada aluno é só a soma dos pesos dos seus valores: a base inteira é
+# pontuada de uma vez, com um índice na tabela de pesos por fator.
+
+# Fatores do modelo (colunas categóricas; vazios viram o nível 'Não informado')
+FATORES_RISCO = [
+    'faixa_etária', 'faixa_renda_familiar', 'origem', 'sexo', 'estado', 'situação_de_emprego_atual',
+]
+# Estágios com o curso encerrado: os demais alunos (ou todos, sem a coluna) estão ativos
+ESTAGIOS_ENCERRADOS = [*ESTAGIOS_DESISTENCIA, 'Aprovado', 'Reprovado', 'Sem interesse']
+# Colunas que identificam o aluno na tabela de risco, quando a planilha as tem
+COLUNAS_IDENTIFICACAO = ['aluno', 'turma']
+
+# Penalidade L2 dos pesos (o intercepto não é penalizado)
+REGULARIZACAO = 1.0
+# Passos de Newton no máximo e variação dos pesos abaixo da qual o treino para
+ITERACOES_MAXIMAS = 50
+TOLERANCIA = 1e-6
+# Alunos no mínimo em cada classe (desistiu / não desistiu): abaixo disso os pesos
+# refletiriam poucos casos e o modelo não é treinado
+MINIMO_POR_CLASSE = 20
+
+COLUNAS_TREINO = colunas_necessarias(FATORES_RISCO, ('faixa_renda_familiar',))
+
+
+class ModeloRisco:
+    """Pesos da regressão logística: ``pesos[inicios[i] + j]`` é o peso do nível ``niveis[i][j]``
+    do fator ``fatores[i]``. Cada fator tem uma posição a mais no fim, com peso zero, para
+    valores que não apareceram no treino."""
+
+    def __init__(self, fatores, niveis, pesos, intercepto, alunos_treino, taxa_desistencia):
+        self.fatores = fatores
+        self.niveis = niveis
+        self.pesos = pesos
+        self.intercepto = intercepto
+        self.alunos_treino = alunos_treino
+        self.taxa_desistencia = taxa_desistencia
+        self.inicios = np.cumsum([0] + [len(n) + 1 for n in niveis[:-1]])
+
+    def codificar(self, df):
+        """Posição de cada valor na tabela de pesos (alunos × fatores)."""
+        codigos = np.empty((len(df), len(self.fatores)), dtype=np.int32)
+        for i, (fator, niveis) in enumerate(zip(self.fatores, self.niveis)):
+            codigos[:, i] = self.inicios[i] + _codigos(df[fator] if fator in df.columns else None, niveis, len(df))
+        return codigos
+
+    def pontuar(self, codigos):
+        """Probabilidade de desistência de cada linha de ``codigos`` (ver codificar)."""
+        return _sigmoide(self.intercepto + self.pesos[codigos].sum(axis=1))
+
+    def fatores_de_risco(self):
+        """Peso de cada nível, do que mais aumenta o risco ao que mais diminui."""
+        linhas = [
+            (fator, nivel, self.pesos[inicio + j])
+            for fator, niveis, inicio in zip(self.fatores, self.niveis, self.inicios)
+            for j, nivel in enumerate(niveis)
+        ]
+        df = pd.DataFrame(linhas, columns=['fator', 'valor', 'peso'])
+        return df.sort_values('peso', ascending=False, ignore_index=True)
+
+
+def _sigmoide(x):
+    return 1 / (1 + np.exp(-np.clip(x, -30, 30)))
+
+
+def _textos(serie):
+    return serie.astype(str).where(serie.notna(), SEM_INFORMACAO)
+
+
+def _niveis(serie):
+    # Valores distintos do fator, em texto; com categorias, só elas são convertidas
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        niveis = set(serie.cat.remove_unused_categories().cat.categories.astype(str))
+        if serie.hasnans:
+            niveis.add(SEM_INFORMACAO)
+    else:
+        niveis = set(_textos(serie.drop_duplicates()))
+    return pd.Index(sorted(niveis))
+
+
+def _codigos(serie, niveis, n):
+    # Posição de cada valor entre os níveis do fator (len(niveis): valor novo)
+    nulo = niveis.get_indexer([SEM_INFORMACAO])[0]
+    if serie is None:
+        return np.full(n, len(niveis) if nulo < 0 else nulo)
+    # Os valores se repetem muito: só os distintos são comparados com os níveis,
+    # e os códigos das linhas apenas indexam o resultado (o último item é o nulo)
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        linhas, distintos = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        linhas, distintos = pd.factorize(serie)
+    mapa = np.append(niveis.get_indexer(pd.Index(distintos).astype(str)), nulo)
+    mapa[mapa < 0] = len(niveis)
+    return mapa[linhas]
+
+
+def contar_classes(desistiu):
+    """Quantidade de alunos que desistiram e que não desistiram."""
+    desistiu = np.asarray(desistiu, dtype=bool)
+    return {'desistiram': int(desistiu.sum()), 'nao_desistiram': int((~desistiu).sum())}
+
+
+def treinar_modelo(df, desistiu, fatores=FATORES_RISCO, regularizacao=REGULARIZACAO,
+                   minimo_por_classe=MINIMO_POR_CLASSE):
+    """Ajusta a regressão logística de ``desistiu`` (booleano por linha) sobre os ``fatores``.
+
+    As classes entram com o mesmo peso total (as desistências são a maioria do
+    histórico), então a pontuação ordena os alunos mas não é uma taxa calibrada.
+    Com menos de ``minimo_por_classe`` alunos em alguma classe, devolve None.
+    """
+    desistiu = np.asarray(desistiu, dtype=bool)
+    if min(contar_classes(desistiu).values()) < max(minimo_por_classe, 1):
+        return None
+
+    niveis = [_niveis(df[f]) if f in df.columns else pd.Index([SEM_INFORMACAO]) for f in fatores]
+    modelo = ModeloRisco(fatores, niveis, None, 0.0, len(df), float(desistiu.mean()))
+    codigos = modelo.codificar(df)
+
+    # Combinações repetidas viram uma linha, com a quantidade de desistências e de permanências
+    # (cada combinação vira um inteiro só, para agrupar com um np.unique simples)
+    tamanhos = np.array([len(n) + 1 for n in niveis], dtype=np.int64)
+    chaves = (codigos - modelo.inicios) @ np.append(np.cumprod(tamanhos[::-1])[-2::-1], 1)
+    chaves, primeira, grupo = np.unique(chaves, return_index=True, return_inverse=True)
+    combinacoes = codigos[primeira]
+    positivos = np.bincount(grupo, weights=desistiu, minlength=len(combinacoes))
+    negativos = np.bincount(grupo, minlength=len(combinacoes)) - positivos
+    positivos *= len(desistiu) / (2 * desistiu.sum())
+    negativos *= len(desistiu) / (2 * (~desistiu).sum())
+
+    # Matriz one-hot das combinações, com o intercepto na última coluna
+    n_pesos = int(modelo.inicios[-1] + len(niveis[-1]) + 1)
+    x = np.zeros((len(combinacoes), n_pesos + 1))
+    np.put_along_axis(x, combinacoes, 1.0, axis=1)
+    x[:, -1] = 1.0
+    penalidade = np.full(n_pesos + 1, float(regularizacao))
+    penalidade[-1] = 0.0
+
+    # Newton: cada passo resolve um sistema do tamanho do número de pesos
+    theta = np.zeros(n_pesos + 1)
+    for _ in range(ITERACOES_MAXIMAS):
+        p = _sigmoide(x @ theta)
+        gradiente = x.T @ ((positivos + negativos) * p - positivos) + penalidade * theta
+        hessiana = (x.T * ((positivos + negativos) * p * (1 - p))) @ x + np.diag(penalidade)
+        passo = np.linalg.solve(hessiana + 1e-9 * np.eye(len(theta)), gradiente)
+        theta -= passo
+        if np.abs(passo).max() < TOLERANCIA:
+            break
+
+    modelo.pesos, modelo.intercepto = theta[:-1], float(theta[-1])
+    return modelo
+
+
+def preparar_alunos(df):
+    """Colunas padronizadas e faixa de renda da planilha de alunos (que não tem as colunas
+    de desistência exigidas por dataset.preparar)."""
+    df = normalizar_colunas(df.copy())
+    if 'faixa_renda_familiar' not in df.columns and 'renda_familiar_mensal_aproximada' in df.columns:
+        df['faixa_renda_familiar'] = faixas_de_renda(df['renda_familiar_mensal_aproximada'])
+    return df
+
+
+def pontuar_alunos(modelo, df):
+    """Risco de cada aluno ativo de ``df``, do maior para o menor, com o fator que mais pesou."""
+    if 'estágio' in df.columns:
+        df = df[~df['estágio'].isin(ESTAGIOS_ENCERRADOS)]
+    codigos = modelo.codificar(df)
+    contribuicoes = modelo.pesos[codigos]
+    risco = _sigmoide(modelo.intercepto + contribuicoes.sum(axis=1))
+
+    # Fator que mais pesou: categórica sobre os rótulos "fator: valor" da tabela de pesos
+    principal = codigos[np.arange(len(df)), contribuicoes.argmax(axis=1)]
+    rotulos = [
+        f"{fator.replace('_', ' ')}: {nivel}"
+        for fator, niveis in zip(modelo.fatores, modelo.niveis)
+        for nivel in [*niveis, '(valor novo)']
+    ]
+    resultado = df[[c for c in [*COLUNAS_IDENTIFICACAO, *modelo.fatores] if c in df.columns]].copy()
+    resultado['risco'] = risco
+    resultado['principal_fator'] = pd.Categorical.from_codes(principal, rotulos)
+    ordem = np.argsort(-risco, kind='stable')
+    return resultado.iloc[ordem].reset_index(drop=True)
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _treino_risco(caminho, versao):
+    df = preparar(ler_planilha(caminho, COLUNAS_TREINO, versao=versao), apenas_desistencias=False, derivadas=('faixa_renda_familiar',))
+    # Sem estágio não se sabe como o curso terminou: a linha fica fora do treino
+    df = df[df['estágio'] != ESTAGIO_NAO_INFORMADO]
+    desistiu = df['estágio'].isin(ESTAGIOS_DESISTENCIA).to_numpy()
+    return contar_classes(desistiu), treinar_modelo(df, desistiu)
+
+
+@st.cache_resource(show_spinner=False, max_entries=MAX_VERSOES_CACHE)
+def _riscos(caminho_alunos, versao_alunos, caminho_treino, versao_treino):
+    _, modelo = _treino_risco(caminho_treino, versao_treino)
+    if modelo is None:
+        return None
+    return pontuar_alunos(modelo, preparar_alunos(ler_planilha(caminho_alunos, versao=versao_alunos)))
+
+
+def modelo_risco(caminho_treino='perfil_alunos_desistentes_limpo.xlsx'):
+    """Quantidade de alunos de cada classe no histórico e o modelo treinado com eles (None
+    abaixo de MINIMO_POR_CLASSE), uma vez por versão da planilha de histórico."""
+    versao = versao_servida(caminho_treino, ('risco_modelo',), lambda nova: _treino_risco(caminho_treino, nova))
+    return _treino_risco(caminho_treino, versao)
+
+
+def riscos_alunos(caminho_alunos='alunos_pii_none.xlsx', caminho_treino='perfil_alunos_desistentes_limpo.xlsx'):
+    """Alunos ativos ordenados pelo risco de desistência, pontuados uma vez por versão das duas
+    planilhas; uma planilha nova de qualquer uma é repontuada em segundo plano. None quando
+    o histórico não tem alunos suficientes para treinar o modelo."""
+    versao_alunos = versao_servida(
+        caminho_alunos, ('risco', caminho_treino),
+        lambda nova: _riscos(caminho_alunos, nova, caminho_treino, versao_servida(caminho_treino))
+    )
+    versao_treino = versao_servida(
+        caminho_treino, ('risco', caminho_alunos),
+        lambda nova: _riscos(caminho_alunos, versao_servida(caminho_alunos), caminho_treino, nova)
+    )
+    return _riscos(caminho_alunos, versao_alunos, caminho_treino, versao_treino)
@@ -0,0 +1,23 @@
+import os
+
+import pandas as pd
+import pytest
+
+from esquema import aplicar_esquema, converter_datas, datas_invalidas
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+
+
+@pytest.mark.parametrize('planilha', ['desistencia.xlsx', 'perfil_alunos_desistentes_limpo.xlsx'])
+def test_data_sla_sem_datas_invalidas(planilha):
+    bruto = pd.read_excel(os.path.join(PASTA, planilha))
+    assert 'data_sla' in bruto.columns
+    assert datas_invalidas(bruto, aplicar_esquema(bruto)).get('data_sla', 0) == 0
+
+
+def test_valores_fora_do_formato_declarado_nao_viram_nat():
+    serie = pd.Series(['01/02/2023', '2023-03-04', None, 'texto', '2022-08-06 10:00:00.000'])
+    datas = converter_datas(serie, '%d/%m/%Y')
+    assert datas.tolist()[:2] == [pd.Timestamp('2023-02-01'), pd.Timestamp('2023-03-04')]
+    assert datas.iloc[4] == pd.Timestamp('2022-08-06 10:00')
+    assert datas.iloc[2:4].isna().all()
@@ -0,0 +1,5 @@
+from teste_carga import main
+
+
+def test_execucao_sem_erros_termina_com_zero():
+    assert main(['--sessoes', '2', '--trocas', '2']) == 0
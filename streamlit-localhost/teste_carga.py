@@ -0,0 +1,268 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from streamlit.testing.v1 import AppTest
+
+from perfilador import memoria_processo, silenciar_streamlit
+
+# Uso:
+#   python teste_carga.py --sessoes 8 --trocas 6
+#   python teste_carga.py --sessoes 16 --p95-maximo 2.5 --saida carga_resultados.jsonl
+#
+# Cada sessão é um AppTest de dados_alunos.py num processo próprio. O AppTest troca
+# estado global (runtime, config) a cada execução e não pode rodar em várias threads
+# do mesmo processo; por isso as sessões não compartilham os caches entre si, e cada
+# processo aquece os seus antes da medição.
+
+PASTA = os.path.dirname(os.path.abspath(__file__))
+SCRIPT = os.path.join(PASTA, 'dados_alunos.py')
+SESSOES = 8
+TROCAS = 6
+TIMEOUT = 120
+# Espera máxima na largada (aquecimento dos caches das outras sessões incluído)
+TIMEOUT_LARGADA = 600
+# Tempo para cada sessão que já entregou o resultado encerrar antes de ser terminada
+TIMEOUT_ENCERRAMENTO = 30
+# Intervalo entre leituras da memória do processo (segundos)
+INTERVALO_MEMORIA = 0.05
+
+# Chaves dos expanders de gráficos da página Desistências (grafico_sob_demanda)
+EXPANDERS = [
+    'exp_estados_percentual', 'exp_faixa_etaria_media', 'exp_linha_tempo',
+    'exp_motivo_renda', 'exp_periodo_motivo', 'exp_previsao',
+]
+
+
+def paginas():
+    # Importado aqui: o módulo só expõe as páginas quando não roda como app
+    from dados_alunos import page_names_to_funcs
+    return list(page_names_to_funcs)
+
+
+class MonitorMemoria(threading.Thread):
+    """Guarda o pico de memória do processo enquanto o teste roda."""
+
+    def __init__(self, intervalo=INTERVALO_MEMORIA):
+        super().__init__(daemon=True)
+        self.intervalo = intervalo
+        self.inicial = memoria_processo()
+        self.pico = self.inicial
+        self._parar = threading.Event()
+
+    def run(self):
+        while not self._parar.wait(self.intervalo):
+            atual = memoria_processo()
+            if atual is not None and (self.pico is None or atual > self.pico):
+                self.pico = atual
+
+    def parar(self):
+        self._parar.set()
+        self.join()
+        return self.inicial, self.pico, memoria_processo()
+
+
+def percorrer(at, nomes_paginas, trocas, registrar):
+    """Abre o app, troca de página ``trocas`` vezes e abre um expander de gráfico a cada visita.
+
+    No navegador, abrir um expander de gráfico reexecuta só o fragmento dele; o AppTest
+    não simula isso e roda o script inteiro, então o tempo medido é um limite superior.
+    """
+    def executar(acao, pagina, rodar):
+        inicio = time.perf_counter()
+        try:
+            rodar()
+            erro = [e.message for e in at.exception] or None
+        except Exception as e:  # timeout do AppTest, erro no script etc.
+            erro = [repr(e)]
+        registrar({'acao': acao, 'pagina': pagina, 'segundos': time.perf_counter() - inicio, 'erro': erro})
+        return erro is None
+
+    if not executar('abrir', nomes_paginas[0], at.run):
+        return
+    for i in range(trocas):
+        pagina = nomes_paginas[(i + 1) % len(nomes_paginas)]
+        if not executar('trocar_pagina', pagina, lambda: at.sidebar.selectbox[0].select(pagina).run()):
+            return
+        fechado = [chave for chave in EXPANDERS if chave in at.session_state and not at.session_state[chave]]
+        if fechado:
+            at.session_state[fechado[0]] = True
+            if not executar('abrir_expander', pagina, at.run):
+                return
+
+
+def sessao(numero, trocas, timeout, aquecer, largada, fila):
+    """Processo de uma sessão: aquece os caches, espera a largada e mede."""
+    try:
+        _medir_sessao(numero, trocas, timeout, aquecer, largada, fila)
+    except Exception as e:
+        # A falha vai para a fila, para o processo principal mostrar o motivo
+        fila.put({'sessao': numero, 'falha': repr(e)})
+        raise
+
+
+def _medir_sessao(numero, trocas, timeout, aquecer, largada, fila):
+    silenciar_streamlit()
+    os.chdir(PASTA)
+    nomes_paginas = paginas()
+
+    # Uma passada fora da medição, para os caches do processo já estarem montados
+    if aquecer:
+        percorrer(AppTest.from_file(SCRIPT, default_timeout=timeout), nomes_paginas, len(nomes_paginas), lambda r: None)
+
+    at = AppTest.from_file(SCRIPT, default_timeout=timeout)
+    resultados = []
+    monitor = MonitorMemoria()
+    # Se outra sessão morrer antes da largada, a barreira é quebrada (BrokenBarrierError)
+    largada.wait(TIMEOUT_LARGADA)
+    monitor.start()
+    inicio = time.time()
+    percorrer(at, nomes_paginas, trocas, lambda r: resultados.append({'sessao': numero, **r}))
+    fim = time.time()
+    _, memoria_pico, _ = monitor.parar()
+    fila.put({
+        'sessao': numero,
+        'inicio': inicio,
+        'fim': fim,
+        'memoria_pico_mb': memoria_pico / 1e6 if memoria_pico else None,
+        'resultados': resultados,
+    })
+
+
+def percentis(valores):
+    if not valores:
+        return {}
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {'p50': p50, 'p95': p95, 'p99': p99, 'max': max(valores)}
+
+
+def executar_teste(sessoes=SESSOES, trocas=TROCAS, timeout=TIMEOUT, aquecer=True):
+    """Roda ``sessoes`` sessões simultâneas e devolve o resumo, a latência por página e as medições."""
+    contexto = multiprocessing.get_context('spawn')
+    largada = contexto.Barrier(sessoes)
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=sessao, args=(n, trocas, timeout, aquecer, largada, fila))
+        for n in range(sessoes)
+    ]
+    for processo in processos:
+        processo.start()
+
+    # Lê a fila antes do join, para nenhum processo ficar preso com dados não lidos.
+    # Cada rerun tem o seu timeout; o prazo total cobre a largada e todas as trocas
+    prazo = time.monotonic() + TIMEOUT_LARGADA + 2 * (trocas + 1) * timeout
+    recebidas = []
+    while len(recebidas) < len(processos) and time.monotonic() < prazo:
+        try:
+            recebidas.append(fila.get(timeout=1))
+        except queue.Empty:
+            if any(p.exitcode not in (None, 0) for p in processos):
+                # Uma sessão morreu: as outras não ficam esperando por ela na largada
+                largada.abort()
+            if not any(p.is_alive() for p in processos):
+                break
+    # Quem entregou o resultado ainda pode estar encerrando: só os que passarem do
+    # prazo (ou não entregaram nada) são terminados
+    encerramento = time.monotonic() + TIMEOUT_ENCERRAMENTO
+    terminados = set()
+    for numero, processo in enumerate(processos):
+        processo.join(max(encerramento - time.monotonic(), 0))
+        if processo.is_alive():
+            processo.terminate()
+            processo.join()
+            terminados.add(numero)
+
+    concluidas = [s for s in recebidas if 'falha' not in s]
+    # Sessão sem resultado (morreu, travou ou falhou) conta como falha, e também a que
+    # terminou com erro sem ter sido terminada aqui
+    falhas = {s['sessao']: s['falha'] for s in recebidas if 'falha' in s}
+    com_resultado = {s['sessao'] for s in concluidas}
+    for numero, processo in enumerate(processos):
+        if numero in falhas:
+            continue
+        if numero not in com_resultado:
+            falhas[numero] = f'sem resultado (código de saída {processo.exitcode})'
+        elif processo.exitcode != 0 and numero not in terminados:
+            falhas[numero] = f'código de saída {processo.exitcode}'
+
+    resultados = [r for s in concluidas for r in s['resultados']]
+    duracao = max(s['fim'] for s in concluidas) - min(s['inicio'] for s in concluidas) if concluidas else 0
+    latencias = [r['segundos'] for r in resultados if r['erro'] is None]
+    picos = [s['memoria_pico_mb'] for s in concluidas if s['memoria_pico_mb'] is not None]
+    resumo = {
+        'sessoes': sessoes,
+        'sessoes_falhas': len(falhas),
+        'falhas': {str(numero): motivo for numero, motivo in sorted(falhas.items())},
+        'trocas': trocas,
+        'reruns': len(resultados),
+        'erros': sum(r['erro'] is not None for r in resultados),
+        'duracao_s': duracao,
+        'reruns_por_s': len(latencias) / duracao if duracao else None,
+        **{f'{nome}_s': valor for nome, valor in percentis(latencias).items()},
+        # Pico de memória de cada processo (uma sessão com os seus caches)
+        'memoria_pico_mb_media': float(np.mean(picos)) if picos else None,
+        'memoria_pico_mb_max': max(picos) if picos else None,
+    }
+    # Latência por página, para achar a que pesa mais
+    por_pagina = {
+        pagina: percentis([r['segundos'] for r in resultados if r['pagina'] == pagina and r['erro'] is None])
+        for pagina in dict.fromkeys(r['pagina'] for r in resultados)
+    }
+    return resumo, por_pagina, resultados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga do dados_alunos.py com sessões simultâneas.')
+    parser.add_argument('--sessoes', type=int, default=SESSOES)
+    parser.add_argument('--trocas', type=int, default=TROCAS, help='trocas de página por sessão')
+    parser.add_argument('--timeout', type=float, default=TIMEOUT, help='tempo máximo de cada rerun (s)')
+    parser.add_argument('--sem-aquecimento', action='store_true', help='mede também a primeira carga dos caches')
+    parser.add_argument('--p95-maximo', type=float, help='falha (código 1) se o p95 passar deste valor (s)')
+    parser.add_argument('--saida', help='acrescenta o resumo a este arquivo JSONL')
+    args = parser.parse_args(argv)
+
+    resumo, por_pagina, resultados = executar_teste(
+        args.sessoes, args.trocas, args.timeout, aquecer=not args.sem_aquecimento
+    )
+
+    print(f"{resumo['sessoes']} sessões, {resumo['reruns']} reruns em {resumo['duracao_s']:.1f} s "
+          f"({resumo['reruns_por_s'] or 0:.2f} reruns/s), {resumo['erros']} erro(s)")
+    for numero, motivo in resumo['falhas'].items():
+        print(f"  sessão {numero} falhou: {motivo}")
+    if 'p50_s' in resumo:
+        print(f"latência: p50 {resumo['p50_s']:.3f} s · p95 {resumo['p95_s']:.3f} s · "
+              f"p99 {resumo['p99_s']:.3f} s · máx {resumo['max_s']:.3f} s")
+    for pagina, valores in por_pagina.items():
+        if valores:
+            print(f"  {pagina:<15} p50 {valores['p50']:.3f} s · p95 {valores['p95']:.3f} s")
+    if resumo['memoria_pico_mb_max'] is not None:
+        print(f"memória por processo: pico médio {resumo['memoria_pico_mb_media']:.0f} MB, "
+              f"máximo {resumo['memoria_pico_mb_max']:.0f} MB")
+    for r in resultados:
+        if r['erro']:
+            print(f"  erro na sessão {r['sessao']} ({r['acao']} {r['pagina']}): {r['erro'][0]}")
+
+    if args.saida:
+        with open(args.saida, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({
+                'execucao': datetime.now().isoformat(timespec='seconds'),
+                'python': platform.python_version(),
+                **resumo,
+                'por_pagina': por_pagina,
+            }, ensure_ascii=False) + '\n')
+
+    if resumo['erros'] or resumo['sessoes_falhas'] or (args.p95_maximo is not None and resumo.get('p95_s', 0) > args.p95_maximo):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())